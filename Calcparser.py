@@ -0,0 +1,133 @@
+"""
+Calcparser.py
+
+Reference lexer for Tableau's calculation language, so formulas are understood rather than
+scanned as raw strings: a [Field] inside a comment or a string literal is not a reference, a
+qualified [Parameters].[Rate] references [Rate], a bare field name (Sales * 2) references
+[Sales], and function names, keywords and FIXED/INCLUDE/EXCLUDE are not references.
+
+parse_formula() turns a formula into a ParsedFormula holding:
+- references:   distinct referenced field IDs ([Sales]) as a tuple, in order of first appearance
+- field_spans:  (start, end, field ID) of every bracketed or bare field name in the text, used by rewrite()
+
+Tableau saves workbooks with broken calculations, so the lexer never raises: characters it
+does not recognise are skipped and the references around them are still reported.
+Results are memoized by formula text, so each distinct formula is lexed once per process
+however many stages (friendly names, lineage, index) look at it; clear_cache() empties the memo.
+"""
+
+import re
+import functools
+from collections import namedtuple
+
+
+# Distinct formulas kept by the parse_formula memo
+PARSE_CACHE_SIZE = 65536
+
+# Leading whitespace is part of every match, so it costs no match of its own
+TOKEN_RE = re.compile(r'''\s*(?:
+    (?P<comment>//[^\r\n]*|/\*.*?\*/)
+  | (?P<field>\[(?:[^\]]|\]\])*\])
+  | (?P<string>"(?:[^"]|"")*"|'(?:[^']|'')*')
+  | (?P<date>\#[^#\r\n]*\#)
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<name>[^\W\d]\w*)
+  | (?P<op><=|>=|<>|!=|==|&&|\|\||[-+*/%^=<>(){},:.])
+  | (?P<error>.)
+  | (?P<space>$)
+)''', re.DOTALL | re.VERBOSE)
+
+KEYWORDS = frozenset(('IF', 'THEN', 'ELSEIF', 'ELSE', 'END', 'CASE', 'WHEN', 'AND', 'OR', 'NOT', 'IN',
+                      'TRUE', 'FALSE', 'NULL'))
+LOD_KEYWORDS = frozenset(('FIXED', 'INCLUDE', 'EXCLUDE'))
+
+Token = namedtuple('Token', 'kind text start end')
+_SKIPPED_TOKENS = frozenset(('space', 'comment'))
+
+
+def tokenize(formula):
+    """Tokens of a formula without whitespace and comments. Unknown characters become 'error' tokens."""
+
+    tokens = []
+    for match in TOKEN_RE.finditer(formula):
+        kind = match.lastgroup
+        if kind in _SKIPPED_TOKENS:
+            continue
+        start, end = match.span(kind)
+        tokens.append(Token(kind, formula[start:end], start, end))
+    return tokens
+
+
+class ParsedFormula(object):
+    """ A formula lexed once: its references and the positions of its field names """
+
+    __slots__ = ('formula', 'references', 'field_spans')
+
+    def __init__(self, formula, references, field_spans):
+        self.formula = formula
+        self.references = references
+        self.field_spans = field_spans
+
+    def rewrite(self, replacements):
+        """Formula with every field name found in replacements (field ID -> text) replaced.
+
+        Only field names are touched, so brackets inside comments and string literals stay as written.
+        """
+
+        pieces = []
+        position = 0
+        for start, end, field_id in self.field_spans:
+            replacement = replacements.get(field_id)
+            if replacement is not None:
+                pieces.append(self.formula[position:start])
+                pieces.append(replacement)
+                position = end
+        if not pieces:
+            return self.formula
+        pieces.append(self.formula[position:])
+        return ''.join(pieces)
+
+
+def _op_at(tokens, index, text):
+    # Token at index exists and is the operator text
+    return 0 <= index < len(tokens) and tokens[index].kind == 'op' and tokens[index].text == text
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_formula(formula):
+    """ParsedFormula for a formula string (memoized; treat the result as read-only)."""
+
+    tokens = tokenize(formula)
+    references = {}
+    field_spans = []
+    for index, token in enumerate(tokens):
+        if token.kind == 'field':
+            # [Datasource].[Field]: the datasource part is a qualifier, not a reference
+            qualifier = (_op_at(tokens, index + 1, '.') and index + 2 < len(tokens)
+                         and tokens[index + 2].kind == 'field')
+            if not qualifier:
+                references[token.text] = None
+            # Qualifiers are rewritten like any other bracketed name
+            field_spans.append((token.start, token.end, token.text))
+        elif token.kind == 'name':
+            word = token.text.upper()
+            if (word in KEYWORDS or _op_at(tokens, index + 1, '(')
+                    or (word in LOD_KEYWORDS and _op_at(tokens, index - 1, '{'))):
+                continue
+            # A field name written without brackets is the same reference as [name]
+            field_id = f'[{token.text}]'
+            references[field_id] = None
+            field_spans.append((token.start, token.end, field_id))
+    return ParsedFormula(formula, tuple(references), tuple(field_spans))
+
+
+def clear_cache():
+    """Forget every memoized parse_formula result (benchmarks call this so each timed run lexes from scratch)."""
+    parse_formula.cache_clear()
+
+
+def formula_references(formula):
+    """Distinct field IDs a formula references, in order of first appearance ([] for a missing formula)."""
+    if not isinstance(formula, str):
+        return []
+    return list(parse_formula(formula).references)
@@ -8,7 +8,11 @@ Designed for use with Tableau Calculation Extractor.
 """
 
 import os
+import re
+import zipfile
 import pandas as pd
+import xlsxwriter
+from xlsxwriter.utility import xl_rowcol_to_cell
 
 
 def create_output_paths(base_dir, filename_base):
@@ -149,6 +153,180 @@ def create_excel_from_dfs(dfs_to_use, excel_path, column_widths=None):
             worksheet.freeze_panes(1, 0)
 
 
+def write_excel_records(records, columns, excel_path, sheet_name='Sheet', column_widths=None, color='#B7DEE8',
+                        footer='Page &P of &N'):
+    """
+    Fast single-sheet writer: same layout as create_excel_from_dfs, without pandas.
+
+    Rows are written straight from an iterable of tuples (one value per column) with xlsxwriter's
+    constant_memory mode, which flushes each row to disk as soon as the next one starts, so
+    memory stays flat however many rows there are. Formats are created once up front.
+
+    Parameters:
+    -----------
+    records : iterable of tuple
+        Data rows in column order; None and NaN values are left blank, like DataFrame.to_excel
+    columns : list of str
+        Header row
+    excel_path : str
+        Full path where the Excel file should be saved
+    column_widths, color, footer :
+        Same meaning as 'normalColWidth', 'color' and 'footer' in create_excel_from_dfs
+    """
+    if column_widths is None:
+        column_widths = [15, 12, 15, 50, 20, 25, 30]
+
+    workbook = xlsxwriter.Workbook(excel_path, {'constant_memory': True})
+    try:
+        worksheet = workbook.add_worksheet(sheet_name)
+
+        # Header format with custom color
+        header_fmt = workbook.add_format({
+            'bold': True, 'bg_color': color, 'border': 1,
+            'align': 'center', 'valign': 'vcenter', 'font_size': 11
+        })
+        # Data format (applied through the column format, as in create_excel_from_dfs)
+        data_fmt = workbook.add_format({
+            'border': 1, 'text_wrap': True, 'valign': 'top', 'font_size': 10
+        })
+
+        for col_idx, width in enumerate(column_widths):
+            if col_idx < len(columns):
+                worksheet.set_column(col_idx, col_idx, width, data_fmt)
+
+        # Page setup (A4, landscape)
+        worksheet.set_paper(9)
+        worksheet.set_landscape()
+        worksheet.fit_to_pages(1, 0)
+        worksheet.set_margins(left=0.5, right=0.5, top=0.75, bottom=0.75)
+        worksheet.set_footer(f'&C{footer}')
+
+        # Freeze header row
+        worksheet.freeze_panes(1, 0)
+
+        # constant_memory needs rows written in order: header first, then the data
+        for col_idx, value in enumerate(columns):
+            worksheet.write(0, col_idx, value, header_fmt)
+
+        write = worksheet.write
+        for row_idx, record in enumerate(records, start=1):
+            for col_idx, value in enumerate(record):
+                # None and NaN (value != value) are left blank
+                if value is not None and value == value:
+                    write(row_idx, col_idx, value)
+    finally:
+        workbook.close()
+
+    return excel_path
+
+
+# Cell XML of write_excel_records files (xlsxwriter's constant_memory in-line strings), for patch_excel_rows
+_SHEET_MEMBER = 'xl/worksheets/sheet1.xml'
+_SPECIAL_STRING_RE = re.compile(r'^(?:=|\{=.*\}$|<r>.*</r>$|(?:ftp|http)s?://|mailto:|(?:in|ex)ternal:|file://)', re.DOTALL)
+_ESCAPED_CONTROL_RE = re.compile(r'(_x[0-9a-fA-F]{4}_)')
+_CONTROL_CHARACTER_RE = re.compile(r'([\x00-\x08\x0b-\x1f])')
+_EDGE_WHITESPACE_RE = re.compile(r'^\s|\s$')
+_COLUMN_STYLE_RE = re.compile(r'<col min="(\d+)" max="(\d+)"[^>]* style="(\d+)"')
+
+
+def _column_styles(sheet):
+    # Column index -> format index of the <cols> entries, which xlsxwriter also puts on each cell of the column
+    styles = {}
+    for first, last, style in _COLUMN_STYLE_RE.findall(sheet[:sheet.find('<sheetData')]):
+        for col_idx in range(int(first) - 1, int(last)):
+            styles[col_idx] = style
+    return styles
+
+
+def _cell_xml(row_idx, col_idx, value, styles):
+    # One data cell as write_excel_records writes it: '' for a blank, None when this module can't reproduce it
+    if value is None or value != value or value == '':
+        return ''
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        return None
+    style = f' s="{styles[col_idx]}"' if col_idx in styles else ''
+    cell = f'r="{xl_rowcol_to_cell(row_idx, col_idx)}"{style}'
+    if not isinstance(value, str):
+        return f'<c {cell}><v>{value:.16G}</v></c>'
+    if len(value) > 32767 or _SPECIAL_STRING_RE.match(value):
+        return None
+
+    value = _ESCAPED_CONTROL_RE.sub(r'_x005F\1', value)
+    value = _CONTROL_CHARACTER_RE.sub(lambda match: f'_x{ord(match.group(1)):04X}_', value)
+    value = value.replace('\ufffe', '_xFFFE_').replace('\uffff', '_xFFFF_')
+    preserve = ' xml:space="preserve"' if _EDGE_WHITESPACE_RE.search(value) else ''
+    value = value.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    return f'<c {cell} t="inlineStr"><is><t{preserve}>{value}</t></is></c>'
+
+
+def _row_xml(row_idx, record, styles):
+    cells = [_cell_xml(row_idx, col_idx, value, styles) for col_idx, value in enumerate(record)]
+    if None in cells:
+        return None
+    return f'<row r="{row_idx + 1}">{"".join(cells)}</row>'
+
+
+def patch_excel_rows(excel_path, rows):
+    """
+    Rewrite some data rows of a file written by write_excel_records, leaving everything else as is.
+
+    Much faster than writing the file again when only a few rows changed: the sheet XML is
+    edited as text and the package re-zipped, with no per-cell work for the unchanged rows.
+
+    Parameters:
+    -----------
+    excel_path : str
+        File written by write_excel_records
+    rows : iterable of (int, tuple, tuple)
+        (row index as passed to write_excel_records, counting the header as 0, previous record, new record)
+
+    Returns True when the file was patched. Returns False and leaves the file untouched when a
+    previous record does not match the file (it was written differently or edited since) or a
+    value needs more than a plain string or number cell; the caller then writes the file again.
+    """
+    rows = sorted(rows, key=lambda row: row[0])
+    if not rows:
+        return True
+
+    try:
+        with zipfile.ZipFile(excel_path) as package:
+            members = [(info, package.read(info)) for info in package.infolist()]
+    except (OSError, zipfile.BadZipFile):
+        return False
+
+    sheet_index = next((i for i, (info, _) in enumerate(members) if info.filename == _SHEET_MEMBER), None)
+    if sheet_index is None:
+        return False
+    sheet = members[sheet_index][1].decode('utf-8')
+    styles = _column_styles(sheet)
+
+    pieces = []
+    position = 0
+    for row_idx, previous, record in rows:
+        start = sheet.find(f'<row r="{row_idx + 1}">', position)
+        end = sheet.find('</row>', start) + len('</row>')
+        if start < 0 or end < len('</row>'):
+            return False
+        if _row_xml(row_idx, previous, styles) != sheet[start:end]:
+            return False
+        replacement = _row_xml(row_idx, record, styles)
+        if replacement is None or replacement == f'<row r="{row_idx + 1}"></row>':
+            return False
+        pieces.append(sheet[position:start])
+        pieces.append(replacement)
+        position = end
+    pieces.append(sheet[position:])
+    members[sheet_index] = (members[sheet_index][0], ''.join(pieces).encode('utf-8'))
+
+    # Write next to the file and swap it in, so a failed write never leaves half a workbook
+    temp_path = excel_path + '.tmp'
+    with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as package:
+        for info, data in members:
+            package.writestr(info, data)
+    os.replace(temp_path, excel_path)
+    return True
+
+
 # Example usage (for testing or integration):
 if __name__ == "__main__":
     # Example DataFrame
@@ -0,0 +1,126 @@
+"""
+Extractioncache.py
+
+On-disk cache of extraction results, so unchanged workbooks skip parsing entirely.
+
+Entries are keyed by a SHA-256 of the workbook XML (the inner .twb for a .twbx, so re-zipping
+a packaged workbook with new thumbnails or extracts does not matter) together with the
+extractor version, and hold the field tables and the lineage nodes/edges as one pickle file.
+Hashing the XML is a sequential read, far cheaper than building the document tree.
+
+The cache directory is bounded in size: every hit refreshes the entry's modification time,
+and after each write the least recently used entries are deleted until the total fits in
+max_bytes. Several batch worker processes may share one directory; writes go through a
+temporary file and os.replace, and entries that vanish under a concurrent eviction are
+treated as misses.
+"""
+
+import os
+import pickle
+import hashlib
+
+import Streamextractor as sx
+
+
+CACHE_SUFFIX = '.pkl'
+
+# Default size bound of the cache directory
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def workbook_digest(workbook_path):
+    """SHA-256 hex digest of the workbook XML (the inner .twb for a .twbx)."""
+
+    digest = hashlib.sha256()
+    with sx.open_twb_stream(workbook_path) as twb_file:
+        for chunk in iter(lambda: twb_file.read(_HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache(object):
+    """ Size-bounded LRU cache of pickled extraction results in a directory """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def key_for(self, workbook_path, version, digest=None):
+        """Cache key of a workbook for a given extractor version (pass digest if it is already known)."""
+        if digest is None:
+            digest = workbook_digest(workbook_path)
+        return hashlib.sha256(f"{version}:{digest}".encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_SUFFIX)
+
+    def get(self, key):
+        """Cached value for key, or None on a miss (including unreadable entries)."""
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # Written by an incompatible pandas/Python, or truncated: drop it and recompute
+            self._remove(path)
+            return None
+        return value
+
+    def put(self, key, value):
+        """Store value under key, then evict least recently used entries over max_bytes."""
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def entries(self):
+        """(mtime, size, path) of every entry, least recently used first."""
+
+        entries = []
+        try:
+            names = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            if not name.endswith(CACHE_SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,1672 @@
+"""
+Extractorengine.py
+
+Importable extraction and lineage engine shared by the command-line script, the GUI and batch workers.
+
+The pipeline is split into stages that can be called separately:
+    load_workbook -> extract_calculations -> resolve_lineage -> render_excel / render_html
+process_workbook() runs all of them for one workbook and run_batch() fans a directory of
+workbooks out over a process pool. Importing this module has no side effects, so a
+long-lived worker can process many workbooks in one interpreter.
+"""
+
+import os
+import re
+import string
+import itertools
+import functools
+import time
+import json
+import hashlib
+import traceback
+import webbrowser
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from html import escape
+
+import numpy as np
+import pandas as pd
+from lxml import etree
+from tableaudocumentapi import Workbook
+from tableaudocumentapi.xfile import (TableauInvalidFileException, TableauVersionNotSupportedException,
+                                      MIN_SUPPORTED_VERSION, Version)
+
+import Excelcreator as exg
+import Streamextractor as sx
+import Lineagelayout as ll
+import Graphexporter as gx
+import Extractioncache as xc
+import Lineagegraph as lg
+import Stageprofiler as sp
+import Calcparser as cp
+
+
+# Part of the extraction cache key: bump whenever extract_calculations/resolve_lineage output changes
+EXTRACTOR_VERSION = '3.8'
+
+# Column widths optimized for: Field_Name(25), DataType(12), Type(18), Calculation(60), Field_ID(30), Datasource(25), Worksheets(40), Used_In_Report(15)
+EXCEL_COLUMN_WIDTHS = [25, 12, 18, 60, 30, 25, 40, 15]
+
+
+# ## String helpers
+
+
+def removeSpecialCharFromStr(spstring):
+    
+#     """
+#     input: string
+#     output: new string, without any special char
+#     """
+    
+    return ''.join(e for e in spstring if e.isalnum())
+
+
+def removeSpecialCharFromStr_leaveSpaces(spstring):
+  
+    return ''.join(e for e in spstring if (e.isalnum() or e ==' '))
+
+
+def remove_sp_char_then_turn_spaces_into_underscore(string_to_convert):
+    filtered_string = re.sub(r'[^a-zA-Z0-9\s_]', '', string_to_convert).replace(' ', "_")
+    return filtered_string
+
+
+def remove_sp_char_leave_undescore_square_brackets(string_to_convert):
+    # Clean special characters from strings while keeping underscores and square brackets
+    filtered_string = re.sub(r'[^a-zA-Z0-9\s._\[\]]', '', string_to_convert).replace(' ', "_")
+    return filtered_string
+
+
+# ## File handling
+
+def find_tableau_file(inputfile):
+    """Return the input filename if it is a .twb or .twbx, else return empty string.
+
+    This does not rename files. It simply filters supported types.
+    """
+
+    if inputfile.lower().endswith('.twb') or inputfile.lower().endswith('.twbx'):
+        return inputfile
+    return ""
+
+
+def find_tableau_files(root_dir):
+    """Return every .twb/.twbx below root_dir (recursively), sorted for a stable batch order."""
+
+    found = []
+    for dirpath, _dirnames, filenames in os.walk(root_dir):
+        for f in filenames:
+            if find_tableau_file(f):
+                found.append(os.path.join(dirpath, f))
+    return sorted(found)
+
+
+def workbook_name_substring(workbook_path):
+    """Substring used when naming the exported files (file name without extension, max 30 chars)."""
+    return os.path.splitext(os.path.basename(workbook_path))[0][:30]
+
+
+def output_file_paths(output_dir, tableau_name_substring):
+    """Return (excel_path, html_path) for a workbook inside output_dir."""
+    excel_path = os.path.join(output_dir, f"{tableau_name_substring}_Calculations_table.xlsx")
+    html_path = os.path.join(output_dir, f"{tableau_name_substring}_lineage_diagram.html")
+    return excel_path, html_path
+
+
+# ## Stage 1: load
+
+class _ParsedWorkbook(Workbook):
+    """Document API Workbook built from an XML tree we have already parsed.
+
+    Workbook() only accepts a file name and, for .twbx, goes through its own archive handling;
+    this lets load_workbook hand it the tree parsed straight from the zip member instead. The
+    checks Workbook() runs through xml_open() (minimum version, then root tag) are kept.
+    """
+
+    def __init__(self, workbook_tree, filename):
+        self._filename = filename
+        self._workbookTree = workbook_tree
+        self._workbookRoot = workbook_tree.getroot()
+        file_version = Version(self._workbookRoot.attrib.get('version', '0.0'))
+        if file_version < MIN_SUPPORTED_VERSION:
+            raise TableauVersionNotSupportedException(file_version)
+        if self._workbookRoot.tag != 'workbook':
+            raise TableauInvalidFileException(f"'{filename}' is not a valid 'workbook' file")
+
+        self._dashboards = self._prepare_dashboards(self._workbookRoot)
+        self._datasources = self._prepare_datasources(self._workbookRoot)
+        self._datasource_index = self._prepare_datasource_index(self._datasources)
+        self._worksheets = self._prepare_worksheets(self._workbookRoot, self._datasource_index)
+        self._shapes = self._prepare_shapes(self._workbookRoot)
+
+
+def load_workbook(workbook_path, streaming=False):
+    """Open a .twb or .twbx with the Tableau Document API.
+
+    Packaged workbooks are recognised up front and their inner .twb is parsed directly from the
+    archive, without a temporary directory or a failed first attempt.
+
+    With streaming=True the file is read in one iterparse pass by Streamextractor instead, which
+    only keeps datasources, fields and worksheet references in memory.
+    """
+
+    if streaming:
+        return sx.stream_workbook(workbook_path)
+
+    with sx.open_twb_stream(workbook_path) as twb_file:
+        workbook_tree = etree.parse(twb_file, etree.XMLParser(huge_tree=True))
+    return _ParsedWorkbook(workbook_tree, workbook_path)
+
+
+# ## Stage 2: extract
+
+# Attributes of a FieldRecord, in the column order of df_API_all
+FIELD_RECORD_COLUMNS = ('counter', 'datasource_name', 'datasource_caption', 'alias', 'field_calculation',
+                        'field_calculation_bk', 'field_caption', 'field_datatype', 'field_def_agg', 'field_desc',
+                        'field_hidden', 'field_id', 'field_is_nominal', 'field_is_ordinal', 'field_is_quantitative',
+                        'field_name', 'field_role', 'field_type', 'field_worksheets')
+
+
+class FieldRecord(object):
+    """ Scalar attributes of one extracted field, without a link back to the parsed workbook
+
+    A Document API Field keeps its lxml element, and any element keeps the whole XML tree alive,
+    so build_collator copies the attributes out and the workbook can be freed after extraction.
+    Item access (record['field_calculation']) works as it did on the former per-field dicts.
+    """
+
+    __slots__ = FIELD_RECORD_COLUMNS
+
+    def __init__(self, **attributes):
+        for name in self.__slots__:
+            setattr(self, name, attributes.get(name))
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+    def __setitem__(self, name, value):
+        setattr(self, name, value)
+
+
+def field_records_frame(records):
+    """DataFrame with one row per FieldRecord and one column per FIELD_RECORD_COLUMNS entry."""
+    return pd.DataFrame({column: [getattr(record, column) for record in records] for column in FIELD_RECORD_COLUMNS})
+
+
+def build_collator(workbook):
+    """Collect one FieldRecord per field of every datasource.
+
+    Returns (collator, calcDict) where calcDict maps calculation IDs (e.g. [Calculation_123]) to friendly names.
+    """
+
+    collator = []
+    calcID = []
+    calcNames = []
+
+    c = 0
+
+    for datasource in workbook.datasources:
+        datasource_name = datasource.name
+        datasource_caption = datasource.caption if datasource.caption else datasource_name
+
+        for field in datasource.fields.values():
+            field_id = field.id if field.id else f"[{field.name}]"
+
+            record = FieldRecord(
+                counter=c,
+                datasource_name=datasource_name,
+                datasource_caption=datasource_caption,
+                alias=field.alias,
+                field_calculation=field.calculation,
+                field_calculation_bk=field.calculation,
+                field_caption=field.caption,
+                field_datatype=field.datatype,
+                field_def_agg=field.default_aggregation,
+                field_desc=field.description,
+                field_hidden=field.hidden,
+                field_id=field_id,
+                field_is_nominal=field.is_nominal,
+                field_is_ordinal=field.is_ordinal,
+                field_is_quantitative=field.is_quantitative,
+                field_name=field.name,
+                field_role=field.role,
+                field_type=field.type,
+                field_worksheets=list(field.worksheets),
+            )
+
+            if field.calculation is not None:
+                calcID.append(field_id)
+                calcNames.append(field.name)
+
+            c += 1
+            collator.append(record)
+
+    calcDict = dict(zip(calcID, calcNames))
+
+    return collator, calcDict
+
+
+def compile_friendly_name_replacer(dictToUse):
+    """Compile the field ID -> friendly name substitution once per workbook.
+
+    Returns a function that rewrites the field references found by the formula lexer (Calcparser), so
+    only whole references such as [Calculation_123] are replaced, never part of a longer ID or
+    text inside comments and string literals.
+    """
+    friendly_refs = {}
+    for field_id, friendly_name in dictToUse.items():
+        friendly_name = str(friendly_name)
+        friendly_refs[field_id] = friendly_name if friendly_name.startswith('[') else '[' + friendly_name + ']'
+
+    def to_friendly_names(formula):
+        return cp.parse_formula(formula).rewrite(friendly_refs)
+
+    return to_friendly_names
+
+
+def default_to_friendly_names2(formulaList,fieldToConvert, dictToUse):
+
+    to_friendly_names = compile_friendly_name_replacer(dictToUse)
+    for i in formulaList:
+        # Fields without a calculation have nothing to rewrite
+        if i[fieldToConvert] is not None:
+            i[fieldToConvert] = to_friendly_names(i[fieldToConvert])
+
+    return formulaList
+
+
+# ## Field classification (vectorized: whole columns at once instead of DataFrame.apply per row)
+
+def categorize_field_types(df):
+    """Parameters / Default_Field / Calculated_Field for every row of the collator frame."""
+    return np.select([df['datasource_name'] == 'Parameters', df['field_calculation'].isna()],
+                     ['Parameters', 'Default_Field'], default='Calculated_Field')
+
+
+def has_bracketed_id(field_ids):
+    """True where a field ID contains [ or ]; IDs without brackets are raw relation columns."""
+    return field_ids.str.contains(r'[\[\]]', regex=True)
+
+
+# Clean the Worksheets column - convert lists to comma-separated strings without brackets
+def format_worksheets(worksheets):
+    return worksheets.str.join(', ').fillna('')
+
+
+def normalize_field_ids(field_ids):
+    """Normalize field IDs by wrapping them with double underscores ([Sales] -> __Sales__, Sales -> __Sales__)."""
+    bracketed = field_ids.str.replace(r'[\[\]]', '__', regex=True)
+    return pd.Series(np.where(field_ids.str.startswith('['), bracketed, '__' + field_ids + '__'), index=field_ids.index)
+
+
+def clean_field_names(field_names):
+    """Vectorized remove_sp_char_leave_undescore_square_brackets for a whole column."""
+    return field_names.str.replace(r'[^a-zA-Z0-9\s._\[\]]', '', regex=True).str.replace(' ', '_', regex=False)
+
+
+def datasource_fields(workbook, state=None):
+    """Every field of every datasource of a loaded workbook, with friendly-name formulas and field types.
+
+    One row per field and datasource, so a field defined in two datasources has two rows; the
+    report table (extract_calculations) keeps only one of them.
+
+    With an IncrementalState, friendly-name substitution is only redone for calculations that
+    changed since state.previous (see IncrementalState.apply_friendly_names).
+    """
+
+    collator, calcDict = build_collator(workbook)
+
+    if state is None:
+        collator = default_to_friendly_names2(collator,'field_calculation',calcDict)
+    else:
+        collator = state.apply_friendly_names(collator, calcDict)
+
+    df_fields = field_records_frame(collator)
+    df_fields['field_type'] = categorize_field_types(df_fields)
+
+    preference_list=['Parameters', 'Calculated_Field', 'Default_Field']
+    df_fields["field_type"] = pd.Categorical(df_fields["field_type"], categories=preference_list, ordered=True)
+    return df_fields
+
+
+def extract_calculations(workbook, state=None):
+    """Build the field tables for a loaded workbook.
+
+    Returns (df1, df_API_all): df1 is the report table written to Excel, df_API_all keeps every
+    extracted attribute and is the input to resolve_lineage().
+
+    state is an optional IncrementalState, see datasource_fields().
+    """
+
+    df_API_all = datasource_fields(workbook, state)
+
+    #get rid of duplicates for parameters, so only parameters from the explicit Parameters datasource are kept (as they are also listed again under the name of any other datasources)
+    df_API_all = df_API_all.sort_values(["field_id","field_type"]).drop_duplicates(["field_id", 'field_calculation']) 
+
+    # keep only bracketed IDs (the same field ID without [] is a raw relation column)
+    df_API_all = df_API_all[has_bracketed_id(df_API_all['field_id'])]
+
+    df1 = df_API_all[[ 'field_name', 'field_datatype','field_type',  'field_calculation',   'field_id', 'datasource_caption', 'field_worksheets']].copy()
+
+    preference_list=[ 'Default_Field', 'Parameters', 'Calculated_Field']
+    df1["field_type"] = pd.Categorical(df1["field_type"], categories=preference_list, ordered=True)
+    df1 = df1.sort_values(['field_type'])
+
+    df1.columns = ['Field_Name', 'DataType', 'Type', 'Calculation', 'Field_ID', 'Datasource', 'Worksheets']
+
+    df1['Field_Name'] = df1['Field_Name'].str.replace(r'[\[\]]', '', regex=True)
+
+    df1['Worksheets'] = format_worksheets(df1['Worksheets'])
+
+    # Add column to indicate if field is used in any worksheet
+    df1['Used_In_Report'] = np.where(df1['Worksheets'] != '', 'Yes', 'No')
+
+    return df1, df_API_all
+
+
+# ## Stage 3: resolve lineage
+
+def abbreviation_ids(prefix=''):
+    """Endless sequence of diagram node IDs: AA, AB, ..., ZZ, then AAA, AAB, ... (with an optional prefix).
+
+    The first 676 IDs are the original two-letter ones; after that the length grows, so there is
+    no ceiling on the number of nodes.
+    """
+    length = 2
+    while True:
+        for letters in itertools.product(string.ascii_uppercase, repeat=length):
+            yield prefix + ''.join(letters)
+        length += 1
+
+
+# Handle duplicate field names by adding numeric suffixes (e.g., Index, Index1, Index2)
+def differentiate_duplicates(series):
+    counts = series.groupby(series).cumcount() 
+    return series + counts.astype(str).replace('0', '')
+
+
+def formula_references(formula):
+    """Distinct field IDs a formula references, in order of first appearance (see Calcparser)."""
+    return cp.formula_references(formula)
+
+
+def _memoized_references(formula, references):
+    # formula_references() through the optional raw formula -> references memo
+    if references is None:
+        return formula_references(formula)
+    formula_refs = references.get(formula)
+    if formula_refs is None:
+        formula_refs = references[formula] = formula_references(formula)
+    return formula_refs
+
+
+def formula_dependencies(df_API_all, references=None):
+    """Field ID -> field IDs referenced by the formulas of the calculated fields and parameters with that ID."""
+
+    dependencies = {}
+    calcs = df_API_all[df_API_all['field_type'] != 'Default_Field']
+    for field_id, formula in zip(calcs['field_id'], calcs['field_calculation_bk']):
+        formula_refs = _memoized_references(formula, references)
+        if formula_refs:
+            dependencies.setdefault(field_id, []).extend(formula_refs)
+    return dependencies
+
+
+def lineage_membership(df_API_all, references=None, dependencies=None):
+    """Which rows of df_API_all belong in the lineage: True for every field a worksheet depends on.
+
+    That is every field used on a worksheet plus, by reverse reachability over the formula
+    references (one breadth-first search, O(V + E)), every field those use directly or through
+    other calculations, so an intermediate calculation that is never put on a sheet itself still
+    links its inputs to the calculations that use it. Fields reached only by reference are matched
+    by field ID, as the lineage edges are. dependencies is formula_dependencies() if the caller
+    already has it.
+    """
+
+    if dependencies is None:
+        dependencies = formula_dependencies(df_API_all, references)
+    bound = df_API_all['field_worksheets'].str.len() > 0
+
+    reached = set()
+    queue = deque()
+    for field_id, formula, field_type in zip(df_API_all.loc[bound, 'field_id'], df_API_all.loc[bound, 'field_calculation_bk'],
+                                             df_API_all.loc[bound, 'field_type']):
+        if field_type != 'Default_Field':
+            queue.extend(_memoized_references(formula, references))
+    while queue:
+        field_id = queue.popleft()
+        if field_id in reached:
+            continue
+        reached.add(field_id)
+        queue.extend(dependencies.get(field_id, ()))
+
+    return bound | df_API_all['field_id'].isin(reached)
+
+
+def unused_calculations(df_API_all, references=None, members=None, dependencies=None):
+    """Calculated fields outside the lineage, as (unused, transitively_unused) lists of field IDs.
+
+    unused calculations are referenced by no other calculation; transitively unused ones are only
+    referenced by calculations that are themselves unused, so they can go once those are removed.
+    members and dependencies are the lineage_membership() and formula_dependencies() results if
+    the caller already has them (resolve_lineage returns both).
+    """
+
+    if dependencies is None:
+        dependencies = formula_dependencies(df_API_all, references)
+    if members is None:
+        members = lineage_membership(df_API_all, references, dependencies)
+    calcs = df_API_all[~members & (df_API_all['field_type'] == 'Calculated_Field')]
+    referenced = {}
+    for field_id, field_dependencies in dependencies.items():
+        for dependency in field_dependencies:
+            if dependency != field_id:
+                referenced[dependency] = True
+
+    unused = []
+    transitively_unused = []
+    for field_id in dict.fromkeys(calcs['field_id']):
+        (transitively_unused if field_id in referenced else unused).append(field_id)
+    return unused, transitively_unused
+
+
+def build_reference_index(created_calc, references=None):
+    """Inverted index from a referenced field ID to the node IDs (shorthand_abc) of the calcs whose formula uses it.
+
+    Every formula is lexed once (and memoized), so building the index is linear in the total formula length.
+    references is an optional raw formula -> formula_references() memo that is read and filled in.
+    """
+    if references is None:
+        references = {}
+    reference_index = {}
+    for calc_node_id, formula in zip(created_calc['shorthand_abc'], created_calc['field_calculation_bk']):
+        formula_refs = _memoized_references(formula, references)
+        for reference in formula_refs:
+            reference_index.setdefault(reference, []).append(calc_node_id)
+    return reference_index
+
+
+# Identify dependencies between fields by looking up which calculation formulas reference them
+def create_lineage_paths(df, id_column, reference_index):
+    """(from, to) node ID pairs for every calc whose formula references a field of df.
+
+    df needs the raw 'field_id' and the node ID column named by id_column.
+    """
+    lineage_paths = []
+
+    for field_id, node_id in zip(df['field_id'], df[id_column]):
+        for dependent_node_id in reference_index.get(field_id, ()):
+            lineage_paths.append((node_id, dependent_node_id))
+
+    return lineage_paths
+
+
+def default_field_node(node_id, name, datasource, field_id, worksheets):
+    """Diagram node of a default (data source) field."""
+    return {
+        'id': node_id,
+        'label': name,
+        'group': 'default',
+        'title': f'Default Field: {name}',
+        'datasource': datasource,
+        'field_id': field_id,
+        'field_type': 'Default_Field',
+        'formula': None,
+        'worksheets': list(worksheets)
+    }
+
+
+def calculation_node(node_id, name, formula, datasource, field_id, field_type, worksheets):
+    """Diagram node of a calculated field or parameter; formula is shown in its tooltip."""
+    formula = str(formula) if pd.notna(formula) and formula else ''
+    return {
+        'id': node_id,
+        'label': name,
+        'group': 'calculated',
+        'title': f'{name}\n\nFormula:\n{formula}',
+        'datasource': datasource,
+        'field_id': field_id,
+        'field_type': field_type,
+        'formula': formula or None,
+        'worksheets': list(worksheets)
+    }
+
+
+def lineage_edge(from_id, to_id):
+    """Diagram edge from a field to a calculation that references it."""
+    return {
+        'from': from_id,
+        'to': to_id,
+        'arrows': 'to'
+    }
+
+
+def resolve_lineage(df1, df_API_all, references=None):
+    """Work out the lineage diagram for the fields the report depends on (see lineage_membership).
+
+    references is an optional formula -> references memo passed to build_reference_index().
+
+    Returns (nodes, edges, members, dependencies). nodes and edges are lists of dicts in the shape
+    vis.js expects. Besides the vis.js keys, every node carries its Tableau field_id, field_type,
+    datasource caption, formula and worksheets, which the graph exports (Graphexporter.py) and
+    lineage queries (Lineagegraph.py) use. members (lineage_membership) and dependencies
+    (formula_dependencies) are handed on to unused_calculations, so it does not work them out again.
+    """
+
+    # Fields used in a worksheet, directly or through the calculations that are
+    dependencies = formula_dependencies(df_API_all, references)
+    members = lineage_membership(df_API_all, references, dependencies)
+
+    # Map default fields to short abbreviations (AA, AB, etc.) for the diagram
+    # Filter to only include fields that the report depends on (df1 keeps df_API_all's index)
+    def_fields_df = df1[(df1['Type'] == 'Default_Field') & members.reindex(df1.index, fill_value=False)][['Field_ID', 'Field_Name', 'Datasource']].copy()
+    def_fields_original_names = def_fields_df['Field_Name'].tolist()  # Keep original names for display
+
+    # Create abbreviated node IDs for the lineage diagram (AA, AB, AC, etc.)
+    abc_touse = list(itertools.islice(abbreviation_ids(), len(def_fields_df)))
+
+    def_fields_final = pd.DataFrame(list(zip(def_fields_df['Field_ID'].tolist(), abc_touse, def_fields_original_names)),
+                                    columns=['field_id', 'abbrev', 'original'])
+
+    mapping_dict_original_names = dict(zip(abc_touse, def_fields_original_names))  # Map abbrev to original names
+    def_fields_datasources = dict(zip(abc_touse, def_fields_df['Datasource']))  # Map abbrev to datasource caption
+    def_fields_ids = dict(zip(abc_touse, def_fields_df['Field_ID']))  # Map abbrev to Tableau field ID
+    # df1 keeps df_API_all's index, so the worksheet lists can be looked up by row
+    def_fields_worksheets = dict(zip(abc_touse, df_API_all.loc[def_fields_df.index, 'field_worksheets']))
+
+    # Extract calculated fields and parameters, map them to abbreviated IDs (x___AA, x___AB, etc.)
+    # Filter to only include fields that the report depends on, including intermediate calculations
+    created_calc = df_API_all[(df_API_all['field_type'] != 'Default_Field') & members]\
+                    [['field_name', 'field_id', 'field_calculation', 'field_calculation_bk', 'datasource_caption', 'field_type',
+                      'field_worksheets']].copy()
+
+    nlsi_to_use = list(itertools.islice(abbreviation_ids('x___'), len(created_calc)))
+
+    # Store original field names BEFORE cleaning
+    created_calc['field_name_original'] = created_calc['field_name'].copy()
+
+    created_calc['field_name'] = clean_field_names(created_calc['field_name'])
+    created_calc['aa'] = normalize_field_ids(created_calc['field_id'])
+
+    # Create mapping dictionary for calculated field abbreviations
+    calc_map_dict = dict(zip(created_calc['aa'].to_list(), nlsi_to_use))
+
+    # Add abbreviated IDs to calculated fields dataframe and sort in allocation order
+    # (a plain string sort would put x___AAA between x___AA and x___AB)
+    created_calc['shorthand_abc'] = created_calc['aa'].map(calc_map_dict)
+    allocation_order = {shorthand: n for n, shorthand in enumerate(nlsi_to_use)}
+    created_calc.sort_values(by='shorthand_abc', key=lambda ids: ids.map(allocation_order), kind='stable', inplace=True)
+
+    # differentiate field names that have duplicate values (eg. calc field Index appears twice in workbook, now it will be Index, Index1)
+    created_calc['field_name'] = differentiate_duplicates(created_calc['field_name'])
+
+    calc_map_dict_original_names = dict(zip(created_calc['shorthand_abc'], created_calc['field_name_original']))  # Map abbrev to original names
+
+    # Tokenize every formula once (field_calculation_bk still holds the raw IDs) and index the references by node ID
+    reference_index = build_reference_index(created_calc, references)
+
+    # Find all dependencies for default fields, then for calculated fields, as node ID pairs
+    lineage_paths = create_lineage_paths(def_fields_final, 'abbrev', reference_index)
+    lineage_paths += create_lineage_paths(created_calc, 'shorthand_abc', reference_index)
+
+    # Build nodes (fields) and edges (dependencies) for the interactive lineage diagram
+    nodes = []
+    edges = []
+    node_ids = set()
+
+    # Add default fields as nodes (use original names for labels)
+    for abbrev, original_name in mapping_dict_original_names.items():
+        if abbrev not in node_ids:
+            nodes.append(default_field_node(abbrev, original_name, def_fields_datasources[abbrev], def_fields_ids[abbrev],
+                                            def_fields_worksheets[abbrev]))
+            node_ids.add(abbrev)
+
+    # Formula shown in each calc node's tooltip: the first row per node ID, collected in one pass
+    calc_formulas = {}
+    calc_details = {}
+    for abbrev, formula, datasource, field_id, field_type, worksheets in zip(
+            created_calc['shorthand_abc'], created_calc['field_calculation'], created_calc['datasource_caption'],
+            created_calc['field_id'], created_calc['field_type'].astype(str), created_calc['field_worksheets']):
+        calc_formulas.setdefault(abbrev, formula)
+        calc_details.setdefault(abbrev, (datasource, field_id, field_type, worksheets))
+
+    # Add calculated fields as nodes (use original names for labels)
+    for abbrev, original_name in calc_map_dict_original_names.items():
+        if abbrev not in node_ids:
+            nodes.append(calculation_node(abbrev, original_name, calc_formulas.get(abbrev), *calc_details[abbrev]))
+            node_ids.add(abbrev)
+
+    # Build edges from the lineage paths
+    for from_id, to_id in lineage_paths:
+        edges.append(lineage_edge(from_id, to_id))
+
+    return nodes, edges, members, dependencies
+
+
+# ## Stage 4: render Excel
+
+def render_excel(df1, excel_path):
+    """Write the report table to a formatted Excel file.
+
+    Rows go straight from df1 to xlsxwriter in constant_memory mode (Excelcreator.write_excel_records).
+    render_excel_dataframe() is the original DataFrame.to_excel path with the same layout.
+    """
+
+    return exg.write_excel_records(df1.itertuples(index=False, name=None), list(df1.columns), excel_path,
+                                   sheet_name='GeneralDetails', column_widths=EXCEL_COLUMN_WIDTHS,
+                                   color='#fff0b3', footer='Data_1 (DOC API)')
+
+
+def render_excel_dataframe(df1, excel_path):
+    """Write the report table through Excelcreator.create_excel_from_dfs (pandas ExcelWriter)."""
+
+    # Modify this part if you want to add more information/dfs to be saved as a separate sheet in excel
+    dfs_to_use = [{'excelSheetTitle': 'All fields extracted from DOC API', 'df_to_use':df1, 'mainColWidth':'' , 
+                   'normalColWidth': EXCEL_COLUMN_WIDTHS, 'sheetName': 'GeneralDetails', 'footer': 'Data_1 (DOC API)', 'papersize':9, 'color': '#fff0b3'}                
+                 ]
+
+    #papersize: a3 = 8, a4 = 9
+
+    exg.create_excel_from_dfs(dfs_to_use, excel_path)
+    return excel_path
+
+
+# ## Stage 5: render HTML
+
+# The lineage page is written as fixed template pieces around the variable parts
+# (title, Vis.js library, node and edge JSON), so it is streamed to the file and never
+# assembled into one string in memory.
+_HTML_TITLE_OPEN = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>"""
+
+_HTML_LIBRARY_OPEN = """ Calculation Lineage</title>
+"""
+
+_HTML_INLINE_LIBRARY_OPEN = """    <script type="text/javascript">
+"""
+
+_HTML_INLINE_LIBRARY_CLOSE = """
+    </script>
+"""
+
+_HTML_HEADING_OPEN = """    <style>
+        body {
+            font-family: Arial, sans-serif;
+            margin: 0;
+            padding: 20px;
+            background-color: #f5f5f5;
+        }
+        h1 {
+            color: #333;
+            text-align: center;
+        }
+        #mynetwork {
+            width: 100%;
+            height: 800px;
+            border: 1px solid #ddd;
+            background-color: white;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        }
+        .controls {
+            text-align: center;
+            margin: 20px 0;
+            padding: 15px;
+            background-color: white;
+            border-radius: 5px;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        }
+        .controls button {
+            margin: 0 5px;
+            padding: 10px 20px;
+            background-color: #4CAF50;
+            color: white;
+            border: none;
+            border-radius: 4px;
+            cursor: pointer;
+            font-size: 14px;
+        }
+        .controls button:hover {
+            background-color: #45a049;
+        }
+        .legend {
+            margin-top: 20px;
+            padding: 15px;
+            background-color: white;
+            border-radius: 5px;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        }
+        .legend-item {
+            display: inline-block;
+            margin-right: 20px;
+        }
+        .legend-color {
+            display: inline-block;
+            width: 20px;
+            height: 20px;
+            border-radius: 50%;
+            margin-right: 5px;
+            vertical-align: middle;
+        }
+    </style>
+</head>
+<body>
+    <h1>"""
+
+_HTML_NODES_OPEN = """ Calculation Lineage</h1>
+    
+    <div class="controls">
+        <button onclick="network.fit()">Fit to Screen</button>
+        <button onclick="network.moveTo({scale: 1.0})">Reset Zoom</button>
+    </div>
+    
+    <div id="mynetwork"></div>
+    
+    <div class="legend">
+        <strong>Legend:</strong>
+        <div class="legend-item">
+            <span class="legend-color" style="background-color: #97C2FC;"></span>
+            <span>Default Fields</span>
+        </div>
+        <div class="legend-item">
+            <span class="legend-color" style="background-color: #FB7E81;"></span>
+            <span>Calculated Fields</span>
+        </div>
+        <div class="legend-item" id="legend-cluster">
+            <span class="legend-color" style="background-color: #FFD966;"></span>
+            <span>Cluster (click to expand)</span>
+        </div>
+    </div>
+
+    <script type="text/javascript">
+        // Nodes carry precomputed x/y positions (see Lineagelayout.py)
+        var allNodes = """
+
+_HTML_EDGES_OPEN = """;
+        var allEdges = """
+
+_HTML_CLUSTERS_OPEN = """;
+
+        // Large graphs open collapsed: one node per cluster, expanded on click
+        var clusters = """
+
+_HTML_FOOTER = """;
+        var expanded = {};
+        var nodeById = {};
+        allNodes.forEach(function(n) { nodeById[n.id] = n; });
+
+        function isVisible(n) {
+            return n.cluster === undefined || expanded[n.cluster];
+        }
+
+        // Node shown in place of nodeId: itself, or its cluster while that is collapsed
+        function visibleId(nodeId) {
+            var n = nodeById[nodeId];
+            return (n === undefined || isVisible(n)) ? nodeId : 'cluster:' + n.cluster;
+        }
+
+        function visibleGraph() {
+            var visibleNodes = allNodes.filter(isVisible);
+            clusters.forEach(function(c) {
+                if (!expanded[c.id]) {
+                    visibleNodes.push({id: 'cluster:' + c.id, clusterId: c.id, label: c.label, title: c.title,
+                                       x: c.x, y: c.y, group: 'cluster', shape: 'database'});
+                }
+            });
+            var visibleEdges = [];
+            var seen = {};
+            allEdges.forEach(function(e) {
+                var from = visibleId(e.from), to = visibleId(e.to);
+                var key = from + '->' + to;
+                if (from !== to && !seen[key]) {
+                    seen[key] = true;
+                    visibleEdges.push({id: key, from: from, to: to, arrows: 'to'});
+                }
+            });
+            return {nodes: visibleNodes, edges: visibleEdges};
+        }
+
+        // Create nodes and edges data
+        var graph = visibleGraph();
+        var nodes = new vis.DataSet(graph.nodes);
+        var edges = new vis.DataSet(graph.edges);
+        if (clusters.length === 0) {
+            document.getElementById('legend-cluster').style.display = 'none';
+        }
+
+        // Create network
+        var container = document.getElementById('mynetwork');
+        var data = {
+            nodes: nodes,
+            edges: edges
+        };
+        
+        var options = {
+            nodes: {
+                shape: 'box',
+                margin: 10,
+                widthConstraint: {
+                    maximum: 200
+                },
+                font: {
+                    size: 14
+                }
+            },
+            edges: {
+                arrows: {
+                    to: {
+                        enabled: true,
+                        scaleFactor: 0.5
+                    }
+                },
+                smooth: {
+                    type: 'cubicBezier',
+                    forceDirection: 'horizontal'
+                },
+                color: {
+                    color: '#848484',
+                    highlight: '#2B7CE9'
+                }
+            },
+            groups: {
+                default: {
+                    color: {
+                        background: '#97C2FC',
+                        border: '#2B7CE9',
+                        highlight: {
+                            background: '#D2E5FF',
+                            border: '#2B7CE9'
+                        }
+                    }
+                },
+                calculated: {
+                    color: {
+                        background: '#FB7E81',
+                        border: '#E92B36',
+                        highlight: {
+                            background: '#FFB5B8',
+                            border: '#E92B36'
+                        }
+                    }
+                },
+                cluster: {
+                    color: {
+                        background: '#FFD966',
+                        border: '#BF9000',
+                        highlight: {
+                            background: '#FFE699',
+                            border: '#BF9000'
+                        }
+                    }
+                }
+            },
+            layout: {
+                hierarchical: {
+                    enabled: false
+                }
+            },
+            physics: {
+                enabled: false
+            },
+            interaction: {
+                hover: true,
+                tooltipDelay: 100,
+                navigationButtons: true,
+                keyboard: true
+            }
+        };
+        
+        var network = new vis.Network(container, data, options);
+        
+        // Event listener for node clicks
+        network.on("click", function(params) {
+            if (params.nodes.length > 0) {
+                var nodeId = params.nodes[0];
+                var node = nodes.get(nodeId);
+                if (node.clusterId !== undefined) {
+                    // Swap the cluster node for its members (positions are already fixed)
+                    expanded[node.clusterId] = true;
+                    var graph = visibleGraph();
+                    nodes.remove(nodeId);
+                    nodes.update(graph.nodes);
+                    edges.clear();
+                    edges.add(graph.edges);
+                    return;
+                }
+                console.log("Clicked node:", node);
+            }
+        });
+        
+        // Fit network when loaded
+        network.once("stabilizationIterationsDone", function() {
+            network.fit();
+        });
+    </script>
+</body>
+</html>
+"""
+
+
+VISJS_FILENAME = 'vis-network.min.js'
+
+
+@functools.lru_cache(maxsize=None)
+def load_visjs():
+    """Contents of the bundled vis-network.min.js, read from disk once per process."""
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    visjs_path = os.path.join(script_dir, VISJS_FILENAME)
+    with open(visjs_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def write_shared_visjs(assets_dir):
+    """Put one copy of vis-network.min.js in assets_dir for diagrams written in shared-asset mode.
+
+    An existing copy is left alone. The file is written under a temporary name and moved into
+    place, so batch workers racing on the same directory never see a half-written library.
+    """
+
+    visjs_path = os.path.join(assets_dir, VISJS_FILENAME)
+    if not os.path.isfile(visjs_path):
+        os.makedirs(assets_dir, exist_ok=True)
+        temp_path = f"{visjs_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(load_visjs())
+        os.replace(temp_path, visjs_path)
+    return visjs_path
+
+
+def write_lineage_html(file, tableau_name_substring, visjs_content, nodes, edges, visjs_src=None, clusters=()):
+    # Generate interactive HTML lineage diagram using Vis.js library (bundled locally)
+    # Creates a hierarchical network visualization with tooltips showing formulas
+    # With visjs_src the library is referenced by <script src> instead of being inlined
+    file.write(_HTML_TITLE_OPEN)
+    file.write(tableau_name_substring)
+    file.write(_HTML_LIBRARY_OPEN)
+    if visjs_src is None:
+        file.write(_HTML_INLINE_LIBRARY_OPEN)
+        file.write(visjs_content)
+        file.write(_HTML_INLINE_LIBRARY_CLOSE)
+    else:
+        file.write(f'    <script type="text/javascript" src="{escape(visjs_src)}"></script>\n')
+    file.write(_HTML_HEADING_OPEN)
+    file.write(tableau_name_substring)
+    file.write(_HTML_NODES_OPEN)
+    json.dump(nodes, file)
+    file.write(_HTML_EDGES_OPEN)
+    json.dump(edges, file)
+    file.write(_HTML_CLUSTERS_OPEN)
+    json.dump(list(clusters), file)
+    file.write(_HTML_FOOTER)
+
+
+def render_html(nodes, edges, tableau_name_substring, html_path, assets_dir=None, layout=None):
+    """Write the interactive lineage diagram.
+
+    By default Vis.js is bundled inline, so the single HTML file works offline on its own. With
+    assets_dir (shared-asset mode) the library is written once to that directory and the page
+    loads it through a relative <script src>; the output folder still works offline as a whole.
+    layout is the (positioned_nodes, clusters) of Lineagelayout.layout_lineage(nodes, edges) if
+    the caller already has it.
+    """
+
+    visjs_src = None
+    if assets_dir is not None:
+        visjs_path = write_shared_visjs(assets_dir)
+        visjs_src = os.path.relpath(visjs_path, os.path.dirname(os.path.abspath(html_path))).replace(os.sep, '/')
+
+    # Fixed positions (and clusters for large graphs) are computed here, not by vis.js at page load
+    positioned_nodes, clusters = layout if layout is not None else ll.layout_lineage(nodes, edges)
+
+    # Write the page piece by piece to an HTML file with UTF-8 encoding
+    with open(html_path, 'w', encoding='utf-8') as file:
+        write_lineage_html(file, tableau_name_substring, None if visjs_src else load_visjs(), positioned_nodes, edges,
+                           visjs_src=visjs_src, clusters=clusters)
+
+    return html_path
+
+
+# Characters read at a time when patch_lineage_html copies a page
+_HTML_PATCH_CHUNK_SIZE = 1 << 20
+
+
+def _copy_through(source, target, text, pending, replacement=None):
+    # Copy source to target up to and including the next occurrence of text (written as replacement
+    # when given). pending is what was read from source but not written yet; returns the pending
+    # text after the match, or None when source ended without one
+    while True:
+        index = pending.find(text)
+        if index >= 0:
+            target.write(pending[:index])
+            target.write(text if replacement is None else replacement)
+            return pending[index + len(text):]
+        # Keep enough of the end to find a match that straddles two chunks
+        keep = len(pending) - len(text) + 1
+        if keep > 0:
+            target.write(pending[:keep])
+            pending = pending[keep:]
+        chunk = source.read(_HTML_PATCH_CHUNK_SIZE)
+        if not chunk:
+            target.write(pending)
+            return None
+        pending += chunk
+
+
+def patch_lineage_html(html_path, replacements):
+    """Swap node JSON in a diagram written by render_html, without laying out or writing the page again.
+
+    replacements are (previous positioned node, new positioned node) pairs in node order; nodes are
+    written by json.dump, so each one appears in the page exactly as json.dumps() renders it. The
+    page is copied in chunks (the library and the rest of the data pass through untouched), so it
+    is never held in memory as a whole. Returns False and leaves the file untouched when a
+    previous node is not found.
+    """
+
+    temp_path = html_path + '.tmp'
+    with open(html_path, encoding='utf-8') as source, open(temp_path, 'w', encoding='utf-8') as target:
+        pending = _copy_through(source, target, _HTML_NODES_OPEN, '')
+        for previous, node in replacements:
+            if pending is None:
+                break
+            pending = _copy_through(source, target, json.dumps(previous), pending, json.dumps(node))
+        if pending is not None:
+            target.write(pending)
+            for chunk in iter(lambda: source.read(_HTML_PATCH_CHUNK_SIZE), ''):
+                target.write(chunk)
+
+    if pending is None:
+        os.remove(temp_path)
+        return False
+    os.replace(temp_path, html_path)
+    return True
+
+
+# ## Incremental re-extraction
+
+def _same_value(before, after):
+    # Equality for field table cells, where a missing value (NaN) equals another missing value
+    return before is after or before == after or (before != before and after != after)
+
+
+class IncrementalState(object):
+    """ What a run leaves behind for the next incremental run of the same workbook
+
+    The workbook still has to be parsed, but formulas are only rewritten to friendly names
+    when they changed or reference a calculation that was renamed, and formulas are only tokenized
+    when their text is new. When the same fields are in the lineage as last time, the stored nodes
+    and edges are patched for the fields that changed (see patch_lineage) and only the changed
+    Excel rows and diagram nodes are written back into the existing files; anything else falls
+    back to the full stage. A workbook whose XML is unchanged reuses everything.
+    """
+
+    # Part of incremental_state_key: bump whenever the stored attributes change
+    FORMAT = 3
+
+    def __init__(self, previous=None):
+        self.previous = previous
+        self.digest = None             # Extractioncache.workbook_digest() of the workbook this run read
+        self.calc_names = {}           # calcDict of this run: calculation ID -> friendly name
+        self.raw_formulas = {}         # (datasource_name, field_id) -> formula with raw IDs
+        self.friendly_formulas = {}    # (datasource_name, field_id) -> formula with friendly names
+        self.references = {}           # raw formula -> formula_references(), shared with resolve_lineage
+        self.changed = set()           # keys of the calculations recomputed in this run
+        self.df1 = None
+        self.df_API_all = None
+        self.nodes = None
+        self.edges = None
+        self.members = None            # lineage_membership() and formula_dependencies() of this run
+        self.dependencies = None
+        self.changed_nodes = None      # positions in nodes of the nodes patch_lineage rebuilt (None after resolve_lineage)
+        self.edges_changed = True
+        self.positions = None          # (level, x, y, cluster) of every node in the diagram, aligned with nodes
+        self.outputs = {}              # 'excel'/'html' -> settings the file was written with
+
+    def formula_references(self, formula):
+        refs = self.references.get(formula)
+        if refs is None and self.previous is not None:
+            refs = self.previous.references.get(formula)
+        if refs is None:
+            refs = formula_references(formula)
+        self.references[formula] = refs
+        return refs
+
+    def apply_friendly_names(self, collator, calcDict):
+        """Incremental default_to_friendly_names2 for the 'field_calculation' of every collator row.
+
+        A formula is reused from the previous run when its raw text is the same and none of the
+        calculations it references was renamed; otherwise it is rewritten and its key recorded
+        in self.changed (its dependents are picked up through the rename check).
+        """
+
+        previous = self.previous or IncrementalState()
+        renamed = {calc_id for calc_id in calcDict.keys() | previous.calc_names.keys()
+                   if calcDict.get(calc_id) != previous.calc_names.get(calc_id)}
+        to_friendly_names = compile_friendly_name_replacer(calcDict)
+
+        self.calc_names = dict(calcDict)
+        for row in collator:
+            raw_formula = row['field_calculation']
+            if raw_formula is None:
+                continue
+            key = (row['datasource_name'], row['field_id'])
+            refs = self.formula_references(raw_formula)
+            if previous.raw_formulas.get(key) == raw_formula and key in previous.friendly_formulas \
+                    and renamed.isdisjoint(refs):
+                row['field_calculation'] = previous.friendly_formulas[key]
+            else:
+                row['field_calculation'] = to_friendly_names(raw_formula)
+                self.changed.add(key)
+            self.raw_formulas[key] = raw_formula
+            self.friendly_formulas[key] = row['field_calculation']
+
+        return collator
+
+    def carry_over(self):
+        """Take over every result of the previous run, for a workbook whose XML did not change.
+
+        Returns (df1, df_API_all, nodes, edges, members, dependencies).
+        """
+
+        previous = self.previous
+        for name in ('calc_names', 'raw_formulas', 'friendly_formulas', 'references', 'df1', 'df_API_all',
+                     'nodes', 'edges', 'members', 'dependencies', 'positions'):
+            setattr(self, name, getattr(previous, name))
+        self.changed_nodes = []
+        self.edges_changed = False
+        return self.df1, self.df_API_all, self.nodes, self.edges, self.members, self.dependencies
+
+    def patch_lineage(self, df1, df_API_all):
+        """resolve_lineage(df1, df_API_all) worked out from the previous run's nodes and edges.
+
+        Possible when the workbook has the same fields of the same types as last time and the same
+        of them are in the lineage, so every field keeps its node ID: the nodes of the rows whose
+        name, formula, datasource caption or worksheets changed are rebuilt, and the edges into
+        the calculations whose formula changed are replaced. Returns (nodes, edges, members,
+        dependencies) like resolve_lineage, or None when resolve_lineage has to run instead.
+        """
+
+        previous = self.previous
+        if previous is None or previous.df_API_all is None or previous.nodes is None:
+            return None
+        before = previous.df_API_all
+        if not (before.index.equals(df_API_all.index) and before['field_id'].equals(df_API_all['field_id'])
+                and before['field_type'].equals(df_API_all['field_type'])):
+            return None
+
+        # Node order of resolve_lineage: default fields in df1 order, then calculations in df_API_all order
+        dependencies = formula_dependencies(df_API_all, self.references)
+        members = lineage_membership(df_API_all, self.references, dependencies)
+        default_rows = df1.index[(df1['Type'] == 'Default_Field') & members.reindex(df1.index, fill_value=False)]
+        calc_rows = df_API_all.index[(df_API_all['field_type'] != 'Default_Field') & members]
+        if not normalize_field_ids(df_API_all.loc[calc_rows, 'field_id']).is_unique:
+            return None
+        rows = default_rows.append(calc_rows)
+        groups = ['default'] * len(default_rows) + ['calculated'] * len(calc_rows)
+        if [(node['group'], node['field_id']) for node in previous.nodes] != list(zip(groups, df_API_all.loc[rows, 'field_id'])):
+            return None
+
+        changed = set()
+        for column in ('field_name', 'field_calculation', 'field_calculation_bk', 'datasource_caption', 'field_worksheets'):
+            changed.update(row for row, old, new in zip(df_API_all.index, before[column], df_API_all[column])
+                           if not _same_value(old, new))
+
+        nodes = list(previous.nodes)
+        changed_nodes = []
+        retargeted = {}     # node ID -> new raw formula of the calculations whose formula changed
+        for position, row in enumerate(rows):
+            if row not in changed:
+                continue
+            node_id = nodes[position]['id']
+            worksheets = df_API_all.at[row, 'field_worksheets']
+            if position < len(default_rows):
+                nodes[position] = default_field_node(node_id, df1.at[row, 'Field_Name'], df1.at[row, 'Datasource'],
+                                                     df1.at[row, 'Field_ID'], worksheets)
+            else:
+                nodes[position] = calculation_node(node_id, df_API_all.at[row, 'field_name'],
+                                                   df_API_all.at[row, 'field_calculation'],
+                                                   df_API_all.at[row, 'datasource_caption'], df_API_all.at[row, 'field_id'],
+                                                   str(df_API_all.at[row, 'field_type']), worksheets)
+                if not _same_value(before.at[row, 'field_calculation_bk'], df_API_all.at[row, 'field_calculation_bk']):
+                    retargeted[node_id] = df_API_all.at[row, 'field_calculation_bk']
+            changed_nodes.append(position)
+
+        edges = previous.edges
+        if retargeted:
+            sources = {}
+            for node in nodes:
+                sources.setdefault(node['field_id'], []).append(node['id'])
+            edges = [edge for edge in edges if edge['to'] not in retargeted]
+            for node_id, formula in retargeted.items():
+                for reference in _memoized_references(formula, self.references):
+                    edges.extend(lineage_edge(source_id, node_id) for source_id in sources.get(reference, ()))
+            # resolve_lineage lists the edges by the node order of their ends
+            order = {node['id']: position for position, node in enumerate(nodes)}
+            edges.sort(key=lambda edge: (order[edge['from']], order[edge['to']]))
+
+        self.changed_nodes = changed_nodes
+        self.edges_changed = edges != previous.edges
+        return nodes, edges, members, dependencies
+
+    def patch_excel(self, excel_path, settings):
+        """Bring the previous run's Excel file up to date with self.df1 by rewriting the changed rows.
+
+        Returns 'reused' (nothing changed), 'patched', or None when render_excel has to run instead.
+        """
+
+        previous = self.previous
+        if previous is None or previous.outputs.get('excel') != settings or not os.path.isfile(excel_path) \
+                or previous.df1 is None or list(previous.df1.columns) != list(self.df1.columns) \
+                or len(previous.df1) != len(self.df1):
+            return None
+        # Row numbers as write_excel_records counts them, the header being row 0
+        rows = [(row_idx, old, new) for row_idx, (old, new) in enumerate(
+                    zip(previous.df1.itertuples(index=False, name=None), self.df1.itertuples(index=False, name=None)), start=1)
+                if not all(_same_value(a, b) for a, b in zip(old, new))]
+        if not rows:
+            return 'reused'
+        return 'patched' if exg.patch_excel_rows(excel_path, rows) else None
+
+    def patch_html(self, html_path, settings):
+        """Bring the previous run's diagram up to date with self.nodes by swapping the changed nodes.
+
+        Only possible when the edges are unchanged and no node moved to another datasource, since
+        those decide the layout. Returns 'reused', 'patched', or None when render_html has to run instead.
+        """
+
+        previous = self.previous
+        if previous is None or previous.outputs.get('html') != settings or not os.path.isfile(html_path) \
+                or previous.positions is None or self.changed_nodes is None or self.edges_changed:
+            return None
+        replacements = []
+        for position in self.changed_nodes:
+            old, new = previous.nodes[position], self.nodes[position]
+            if old == new:
+                continue
+            if old['datasource'] != new['datasource']:
+                return None
+            replacements.append((ll.positioned_node(old, *previous.positions[position]),
+                                 ll.positioned_node(new, *previous.positions[position])))
+        if replacements and not patch_lineage_html(html_path, replacements):
+            return None
+        self.positions = previous.positions
+        return 'patched' if replacements else 'reused'
+
+    def for_storage(self):
+        """Drop the link to the previous run before the state is written to the cache."""
+        self.previous = None
+        return self
+
+
+def incremental_state_key(workbook_path):
+    """Cache key of a workbook's IncrementalState (by path, since the content is what changes)."""
+    return hashlib.sha256(f"state:{EXTRACTOR_VERSION}:{IncrementalState.FORMAT}:{os.path.abspath(workbook_path)}"
+                          .encode('utf-8')).hexdigest()
+
+
+# ## Whole pipeline
+
+# Stage names reported to process_workbook's on_stage callback, in order
+PIPELINE_STAGES = ('open', 'extract', 'lineage', 'excel', 'html', 'export')
+
+
+class PipelineCancelled(Exception):
+    """Raised by process_workbook between stages when its is_cancelled check returns True."""
+
+
+def process_workbook(workbook_path, output_dir, tableau_name_substring=None, excel=True, html=True, open_browser=False,
+                     streaming=False, on_stage=None, is_cancelled=None, assets_dir=None, exports=(), cache=None,
+                     incremental=False, profile=None):
+    """Run load -> extract -> lineage -> Excel -> HTML -> graph exports for one workbook.
+
+    assets_dir switches the diagram to shared-asset mode (see render_html). exports lists the
+    graph data formats to write from the same nodes and edges (see Graphexporter.EXPORT_FORMATS).
+    With an Extractioncache.ExtractionCache as cache, a workbook whose XML is unchanged since an
+    earlier run skips parsing, extraction and lineage and reuses the stored results.
+    incremental (needs cache) keeps an IncrementalState per workbook path instead, so after a small
+    edit only the changed calculations are rewritten, the lineage is patched rather than resolved
+    again, and only the changed rows and nodes are written into the existing outputs.
+
+    on_stage(stage_name) is called as each stage in PIPELINE_STAGES starts (skipped stages are
+    not reported). is_cancelled() is checked before every stage; when it returns True the run
+    stops with PipelineCancelled, so a front end can cancel without killing a thread.
+
+    profile (one of Stageprofiler.PROFILE_MODES) measures every stage and writes the report to
+    <name>_profile.json next to the outputs (plus <name>_profile.prof in cprofile mode); the
+    report is also returned under the summary's 'profile' key.
+
+    Returns a summary dict with the paths written, the field/node/edge counts and the field IDs of
+    the unused and transitively unused calculations (see unused_calculations).
+    """
+
+    profiler = sp.StageProfiler.for_mode(profile)
+    try:
+        summary = _run_pipeline(workbook_path, output_dir, tableau_name_substring, excel, html, open_browser,
+                                streaming, on_stage, is_cancelled, assets_dir, exports, cache, incremental, profiler)
+    finally:
+        if profiler is not None:
+            profiler.finish()
+
+    if profiler is not None:
+        summary['profile'] = profiler.report()
+        profile_base = os.path.join(output_dir, f"{summary['name']}_profile")
+        with open(profile_base + '.json', 'w', encoding='utf-8') as f:
+            json.dump({'workbook': workbook_path, 'extractor_version': EXTRACTOR_VERSION, **summary['profile']}, f, indent=2)
+        summary['profile_path'] = profile_base + '.json'
+        if profiler.dump_stats(profile_base + '.prof'):
+            summary['cprofile_path'] = profile_base + '.prof'
+    return summary
+
+
+def _run_pipeline(workbook_path, output_dir, tableau_name_substring, excel, html, open_browser, streaming, on_stage,
+                  is_cancelled, assets_dir, exports, cache, incremental, profiler):
+    # Body of process_workbook; profiler (a Stageprofiler.StageProfiler or None) is switched at every stage
+
+    def enter_stage(stage_name):
+        if is_cancelled is not None and is_cancelled():
+            raise PipelineCancelled(f"Cancelled before '{stage_name}' stage of {workbook_path}")
+        if on_stage is not None:
+            on_stage(stage_name)
+        if profiler is not None:
+            profiler.start(stage_name)
+
+    start_time = time.perf_counter()
+
+    if tableau_name_substring is None:
+        tableau_name_substring = workbook_name_substring(workbook_path)
+    os.makedirs(output_dir, exist_ok=True)
+    excel_path, html_path = output_file_paths(output_dir, tableau_name_substring)
+
+    if incremental and cache is None:
+        raise ValueError("Incremental runs need an extraction cache to keep their state in")
+
+    enter_stage('open')
+    cached = None
+    state = None
+    if incremental:
+        # The state of the last run stands in for the extraction cache entry, so unchanged XML reuses it
+        state = IncrementalState(previous=cache.get(incremental_state_key(workbook_path)))
+        state.digest = xc.workbook_digest(workbook_path)
+        if state.previous is not None and state.previous.digest == state.digest:
+            cached = state.carry_over()
+    elif cache is not None:
+        cache_key = cache.key_for(workbook_path, EXTRACTOR_VERSION)
+        cached = cache.get(cache_key)
+
+    if cached is not None:
+        df1, df_API_all, nodes, edges, members, dependencies = cached
+        enter_stage('extract')
+        enter_stage('lineage')
+    else:
+        workbook = load_workbook(workbook_path, streaming=streaming)
+        enter_stage('extract')
+        df1, df_API_all = extract_calculations(workbook, state=state)
+        # The field tables hold plain values only, so this frees the parsed XML before the later stages
+        del workbook
+        enter_stage('lineage')
+        patched = state.patch_lineage(df1, df_API_all) if state is not None else None
+        if patched is not None:
+            nodes, edges, members, dependencies = patched
+        else:
+            nodes, edges, members, dependencies = resolve_lineage(
+                df1, df_API_all, references=state.references if state is not None else None)
+        if state is None and cache is not None:
+            cache.put(cache_key, (df1, df_API_all, nodes, edges, members, dependencies))
+
+    summary = {
+        'workbook': workbook_path,
+        'status': 'ok',
+        'cached': cached is not None,
+        'name': tableau_name_substring,
+        'excel_path': None,
+        'html_path': None,
+        'export_paths': {},
+        'fields': len(df1),
+        'default_fields_used': sum(1 for n in nodes if n['group'] == 'default'),
+        'calculated_fields_used': sum(1 for n in nodes if n['group'] == 'calculated'),
+        'nodes': len(nodes),
+        'edges': len(edges),
+    }
+    summary['unused_calculations'], summary['transitively_unused_calculations'] = unused_calculations(
+        df_API_all, members=members, dependencies=dependencies)
+    if state is not None:
+        state.df1, state.df_API_all, state.nodes, state.edges = df1, df_API_all, nodes, edges
+        state.members, state.dependencies = members, dependencies
+        summary['changed_calculations'] = None if cached is not None else len(state.changed)
+        summary['reused_outputs'] = []
+        summary['patched_outputs'] = []
+
+    def record_output(kind, outcome):
+        # outcome of IncrementalState.patch_excel/patch_html: 'reused', 'patched' or None (written in full)
+        if outcome is not None:
+            summary[f'{outcome}_outputs'].append(kind)
+
+    if excel:
+        enter_stage('excel')
+        settings = (excel_path,)
+        outcome = state.patch_excel(excel_path, settings) if state is not None else None
+        if outcome is None:
+            render_excel(df1, excel_path)
+        record_output('excel', outcome)
+        summary['excel_path'] = excel_path
+        if state is not None:
+            state.outputs['excel'] = settings
+
+    if html:
+        enter_stage('html')
+        settings = (html_path, assets_dir)
+        outcome = state.patch_html(html_path, settings) if state is not None else None
+        if outcome is None:
+            layout = ll.layout_lineage(nodes, edges)
+            render_html(nodes, edges, tableau_name_substring, html_path, assets_dir=assets_dir, layout=layout)
+            if state is not None:
+                state.positions = [(node['level'], node['x'], node['y'], node.get('cluster')) for node in layout[0]]
+        elif assets_dir is not None:
+            write_shared_visjs(assets_dir)
+        record_output('html', outcome)
+        summary['html_path'] = html_path
+        if state is not None:
+            state.outputs['html'] = settings
+        if open_browser:
+            # Open the HTML file in the default web browser
+            webbrowser.open('file://' + os.path.realpath(html_path))
+
+    if exports:
+        enter_stage('export')
+        summary['export_paths'] = gx.export_lineage(nodes, edges, output_dir, tableau_name_substring, exports)
+
+    if state is not None:
+        cache.put(incremental_state_key(workbook_path), state.for_storage())
+
+    summary['seconds'] = round(time.perf_counter() - start_time, 3)
+    return summary
+
+
+# ## Batch mode
+
+def _batch_worker(workbook_path, input_root, output_root, streaming=False, shared_assets=False, exports=(), cache=None,
+                  incremental=False, profile=None):
+    """Process one workbook inside a pool worker. Never raises, so one bad file cannot abort the batch."""
+
+    # Mirror the input folder layout so two workbooks with the same name in different folders don't collide
+    relative_dir = os.path.dirname(os.path.relpath(workbook_path, input_root))
+    output_dir = os.path.join(output_root, relative_dir)
+    start_time = time.perf_counter()
+    try:
+        return process_workbook(workbook_path, output_dir, streaming=streaming,
+                                assets_dir=output_root if shared_assets else None, exports=exports, cache=cache,
+                                incremental=incremental, profile=profile)
+    except Exception as e:
+        return {
+            'workbook': workbook_path,
+            'status': 'error',
+            'error': f"{type(e).__name__}: {e}",
+            'traceback': traceback.format_exc(),
+            'seconds': round(time.perf_counter() - start_time, 3),
+        }
+
+
+def run_batch(input_dir, output_dir, workers=None, streaming=False, shared_assets=False, exports=(), cache=None,
+              incremental=False, profile=None):
+    """Process every workbook under input_dir across a process pool and write batch_summary.json.
+
+    With shared_assets, one vis-network.min.js is written to the root of output_dir and every
+    diagram (in any subfolder) references it instead of inlining its own copy. With profile, every
+    workbook gets its own profile report (see process_workbook).
+
+    Returns the summary dict that was written.
+    """
+
+    workbook_paths = find_tableau_files(input_dir)
+    if not workbook_paths:
+        raise FileNotFoundError(f"No .twb or .twbx file found under '{input_dir}'")
+
+    os.makedirs(output_dir, exist_ok=True)
+    if shared_assets:
+        write_shared_visjs(output_dir)
+    workers = workers or os.cpu_count() or 1
+    print(f"Batch: {len(workbook_paths)} workbooks, {workers} worker processes")
+
+    start_time = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_batch_worker, p, input_dir, output_dir, streaming, shared_assets, exports, cache,
+                               incremental, profile): p for p in workbook_paths}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process itself died (e.g. out of memory); record it and carry on
+                result = {'workbook': futures[future], 'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+            results.append(result)
+            print(f"[{len(results)}/{len(workbook_paths)}] {result['status']}: {result['workbook']}")
+
+    results.sort(key=lambda r: r['workbook'])
+    failed = [r for r in results if r['status'] != 'ok']
+    summary = {
+        'input_dir': os.path.abspath(input_dir),
+        'output_dir': os.path.abspath(output_dir),
+        'workers': workers,
+        'streaming': streaming,
+        'shared_assets': shared_assets,
+        'exports': list(exports),
+        'cache_dir': os.path.abspath(cache.cache_dir) if cache is not None else None,
+        'cache_hits': sum(1 for r in results if r.get('cached')),
+        'incremental': incremental,
+        'profile': profile,
+        'workbooks': len(results),
+        'succeeded': len(results) - len(failed),
+        'failed': len(failed),
+        'seconds': round(time.perf_counter() - start_time, 3),
+        'results': results,
+    }
+
+    summary_path = os.path.join(output_dir, 'batch_summary.json')
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"\nBatch finished: {summary['succeeded']} succeeded, {summary['failed']} failed in {summary['seconds']}s")
+    print(f"Summary written to {summary_path}")
+    return summary
+
+
+# ## Lineage queries
+
+def load_extraction(workbook_path, streaming=False, cache=None, digest=None):
+    """(df1, df_API_all, nodes, edges, members, dependencies) of a workbook (see resolve_lineage),
+    read from the extraction cache when it is unchanged.
+
+    digest is the workbook's Extractioncache.workbook_digest() if the caller already has it.
+    """
+
+    if cache is not None:
+        cache_key = cache.key_for(workbook_path, EXTRACTOR_VERSION, digest)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    df1, df_API_all = extract_calculations(load_workbook(workbook_path, streaming=streaming))
+    extraction = (df1, df_API_all) + resolve_lineage(df1, df_API_all)
+    if cache is not None:
+        cache.put(cache_key, extraction)
+    return extraction
+
+
+def load_datasource_fields(workbook_path, streaming=False, cache=None, digest=None):
+    """datasource_fields() of a workbook, read from the extraction cache when it is unchanged.
+
+    digest is the workbook's Extractioncache.workbook_digest() if the caller already has it.
+    """
+
+    if cache is not None:
+        cache_key = cache.key_for(workbook_path, f"{EXTRACTOR_VERSION}:datasource_fields", digest)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    df_fields = datasource_fields(load_workbook(workbook_path, streaming=streaming))
+    if cache is not None:
+        cache.put(cache_key, df_fields)
+    return df_fields
+
+
+def load_lineage(workbook_path, streaming=False, cache=None):
+    """(nodes, edges) of a workbook, read from the extraction cache when the workbook is unchanged."""
+
+    _, _, nodes, edges, _, _ = load_extraction(workbook_path, streaming=streaming, cache=cache)
+    return nodes, edges
+
+
+def query_workbook_lineage(workbook_path, fields=(), streaming=False, cache=None):
+    """Graph statistics of one workbook plus the upstream/downstream closure of each requested field.
+
+    Never raises, so it can run in a pool over thousands of workbooks; errors are reported in the result.
+    """
+
+    start_time = time.perf_counter()
+    try:
+        graph = lg.LineageGraph(*load_lineage(workbook_path, streaming=streaming, cache=cache))
+        result = {
+            'workbook': workbook_path,
+            'status': 'ok',
+            'nodes': len(graph.nodes),
+            'edges': sum(len(s) for s in graph.successors.values()),
+            'max_depth': max(graph.depth.values(), default=0),
+            'cycles': [[graph.nodes[n]['label'] for n in cycle] for cycle in graph.cycles()],
+            'fields': [],
+        }
+        for field in fields:
+            node_id = graph.resolve(field)
+            if node_id is None:
+                result['fields'].append({'query': field, 'found': False})
+            else:
+                result['fields'].append(dict(graph.describe(node_id), query=field, found=True))
+    except Exception as e:
+        result = {'workbook': workbook_path, 'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+    result['seconds'] = round(time.perf_counter() - start_time, 3)
+    return result
+
+
+def query_lineage(paths, fields=(), workers=1, streaming=False, cache=None):
+    """Yield query_workbook_lineage() results for every workbook in paths (files or directories).
+
+    With more than one worker the workbooks are spread over a process pool like run_batch(),
+    and results are yielded as they finish.
+    """
+
+    workbook_paths = []
+    for path in paths:
+        workbook_paths.extend(find_tableau_files(path) if os.path.isdir(path) else [path])
+
+    if workers is None or workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(query_workbook_lineage, p, fields, streaming, cache) for p in workbook_paths]
+            for future in as_completed(futures):
+                yield future.result()
+    else:
+        for workbook_path in workbook_paths:
+            yield query_workbook_lineage(workbook_path, fields, streaming, cache)
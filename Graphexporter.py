@@ -0,0 +1,137 @@
+"""
+Graphexporter.py
+
+Writes the lineage graph as data files for downstream tooling (catalog ingestion, graph
+databases, notebooks), so nobody has to scrape the nodes and edges out of the HTML page.
+
+Two tables are exported:
+- nodes: one row per field in the diagram, keyed by its Tableau field ID (stable across runs,
+  unlike the AA / x___AA diagram IDs which depend on field order)
+- edges: one row per dependency, "source is referenced by target"
+
+Formats:
+- jsonl:   <name>_lineage_nodes.jsonl and <name>_lineage_edges.jsonl, one JSON object per line
+- graphml: <name>_lineage.graphml, nodes and edges with their attributes as GraphML <data>
+- parquet: <name>_lineage_nodes.parquet and <name>_lineage_edges.parquet (needs pyarrow)
+
+Every writer consumes the rows one at a time (Parquet in fixed-size record batches), so
+memory use does not grow with the size of the graph beyond the nodes/edges lists that the
+pipeline already holds.
+"""
+
+import os
+import json
+import itertools
+
+from lxml import etree as ET
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional, only needed for the parquet format
+    pa = None
+    pq = None
+
+
+EXPORT_FORMATS = ('jsonl', 'graphml', 'parquet')
+
+NODE_COLUMNS = ('field_id', 'node_id', 'name', 'datasource', 'field_type', 'formula')
+EDGE_COLUMNS = ('source_field_id', 'target_field_id', 'source_node_id', 'target_node_id')
+
+# Rows per Parquet record batch
+PARQUET_BATCH_SIZE = 65536
+
+
+def node_rows(nodes):
+    """Yield one node table row per diagram node."""
+    for node in nodes:
+        yield {
+            'field_id': node['field_id'],
+            'node_id': node['id'],
+            'name': node['label'],
+            'datasource': node['datasource'],
+            'field_type': node['field_type'],
+            'formula': node['formula'],
+        }
+
+
+def edge_rows(nodes, edges):
+    """Yield one edge table row per dependency, with both ends as field IDs and diagram IDs."""
+    field_ids = {node['id']: node['field_id'] for node in nodes}
+    for edge in edges:
+        yield {
+            'source_field_id': field_ids.get(edge['from']),
+            'target_field_id': field_ids.get(edge['to']),
+            'source_node_id': edge['from'],
+            'target_node_id': edge['to'],
+        }
+
+
+def write_jsonl(rows, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False))
+            f.write('\n')
+    return path
+
+
+def write_graphml(nodes, edges, path):
+    """Stream a GraphML document with lxml's incremental writer (nothing is built as a tree)."""
+
+    node_keys = [c for c in NODE_COLUMNS if c != 'field_id']
+    with ET.xmlfile(path, encoding='utf-8') as xf:
+        xf.write_declaration()
+        with xf.element('graphml', xmlns='http://graphml.graphdrawing.org/xmlns'):
+            for column in node_keys:
+                xf.write(ET.Element('key', {'id': column, 'for': 'node', 'attr.name': column, 'attr.type': 'string'}))
+            xf.write('\n')
+            with xf.element('graph', id='lineage', edgedefault='directed'):
+                # GraphML node ids are the Tableau field IDs, so the file is stable across runs
+                for row in node_rows(nodes):
+                    node = ET.Element('node', id=row['field_id'])
+                    for column in node_keys:
+                        if row[column] is not None:
+                            ET.SubElement(node, 'data', key=column).text = str(row[column])
+                    xf.write(node)
+                    xf.write('\n')
+                for row in edge_rows(nodes, edges):
+                    xf.write(ET.Element('edge', source=row['source_field_id'], target=row['target_field_id']))
+                    xf.write('\n')
+    return path
+
+
+def write_parquet(rows, columns, path, batch_size=PARQUET_BATCH_SIZE):
+    """Write rows to Parquet in record batches of batch_size rows (all columns as strings)."""
+
+    if pq is None:
+        raise ImportError("The parquet export needs pyarrow: pip install pyarrow")
+
+    schema = pa.schema([(column, pa.string()) for column in columns])
+    with pq.ParquetWriter(path, schema) as writer:
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+    return path
+
+
+def export_lineage(nodes, edges, output_dir, tableau_name_substring, formats=EXPORT_FORMATS):
+    """Write the requested formats next to the other outputs. Returns {format: [paths]}."""
+
+    unknown = set(formats) - set(EXPORT_FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown export format(s): {', '.join(sorted(unknown))}")
+
+    base = os.path.join(output_dir, tableau_name_substring + '_lineage')
+    written = {}
+    if 'jsonl' in formats:
+        written['jsonl'] = [write_jsonl(node_rows(nodes), base + '_nodes.jsonl'),
+                            write_jsonl(edge_rows(nodes, edges), base + '_edges.jsonl')]
+    if 'graphml' in formats:
+        written['graphml'] = [write_graphml(nodes, edges, base + '.graphml')]
+    if 'parquet' in formats:
+        written['parquet'] = [write_parquet(node_rows(nodes), NODE_COLUMNS, base + '_nodes.parquet'),
+                              write_parquet(edge_rows(nodes, edges), EDGE_COLUMNS, base + '_edges.parquet')]
+    return written
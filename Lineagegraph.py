@@ -0,0 +1,178 @@
+"""
+Lineagegraph.py
+
+In-memory index over a workbook's lineage graph for impact analysis, e.g. "which calculations
+and worksheets are affected if [Region] is renamed?" without walking the diagram by hand.
+
+LineageGraph is built once from the nodes and edges that resolve_lineage() returns (edges point
+from a field to the calculation that references it) and keeps successor and predecessor
+adjacency lists. On that index:
+- upstream() / downstream() return the transitive closure of a node with the distance of every
+  node reached, as one breadth-first search, O(V + E);
+- topological_order and depth (longest path from a field with no inputs, as in the diagram
+  layout) are computed once when the graph is built;
+- cycles() lists the groups of nodes that reference each other (strongly connected components),
+  which Tableau itself rejects but hand-edited or corrupt workbooks can contain.
+
+Nodes can be looked up by diagram ID (AA, x___AB), Tableau field ID ([Calculation_123]) or
+field name.
+"""
+
+from collections import deque
+
+import Lineagelayout as ll
+
+
+class LineageGraph(object):
+    """ Adjacency index over lineage nodes and edges """
+
+    def __init__(self, nodes, edges):
+        self.nodes = {node['id']: node for node in nodes}
+        self.successors = {node_id: [] for node_id in self.nodes}
+        self.predecessors = {node_id: [] for node_id in self.nodes}
+        for edge in edges:
+            source, target = edge['from'], edge['to']
+            if source in self.nodes and target in self.nodes:
+                self.successors[source].append(target)
+                self.predecessors[target].append(source)
+
+        # Field ID and name lookups (first node wins for duplicate names)
+        self._by_key = {}
+        for node in nodes:
+            for key in (node.get('field_id'), node.get('label')):
+                if key is not None:
+                    self._by_key.setdefault(key, node['id'])
+
+        self.depth, _ = ll.longest_path_levels(list(self.nodes), edges)
+        self.topological_order = self._topological_order()
+
+    def _topological_order(self):
+        # Kahn's algorithm; nodes on a cycle never reach in-degree 0 and are left out
+        in_degree = {node_id: len(preds) for node_id, preds in self.predecessors.items()}
+        queue = deque(node_id for node_id, degree in in_degree.items() if degree == 0)
+        order = []
+        while queue:
+            node_id = queue.popleft()
+            order.append(node_id)
+            for successor in self.successors[node_id]:
+                in_degree[successor] -= 1
+                if in_degree[successor] == 0:
+                    queue.append(successor)
+        return order
+
+    @property
+    def has_cycles(self):
+        return len(self.topological_order) < len(self.nodes)
+
+    def resolve(self, reference):
+        """Diagram node ID for a diagram ID, field ID or field name (brackets optional), or None."""
+
+        if reference in self.nodes:
+            return reference
+        for key in (reference, f'[{reference}]', reference.strip('[]')):
+            if key in self._by_key:
+                return self._by_key[key]
+        return None
+
+    def _closure(self, node_id, adjacency):
+        distances = {node_id: 0}
+        queue = deque([node_id])
+        while queue:
+            current = queue.popleft()
+            for neighbour in adjacency[current]:
+                if neighbour not in distances:
+                    distances[neighbour] = distances[current] + 1
+                    queue.append(neighbour)
+        del distances[node_id]
+        return distances
+
+    def upstream(self, node_id):
+        """Every node node_id depends on, directly or transitively, mapped to its distance."""
+        return self._closure(node_id, self.predecessors)
+
+    def downstream(self, node_id):
+        """Every node that depends on node_id, directly or transitively, mapped to its distance."""
+        return self._closure(node_id, self.successors)
+
+    def affected_worksheets(self, node_id):
+        """Worksheets using node_id or anything downstream of it, in first-seen order."""
+
+        worksheets = {}
+        for affected in [node_id, *self.downstream(node_id)]:
+            for worksheet in self.nodes[affected].get('worksheets') or ():
+                worksheets.setdefault(worksheet, None)
+        return list(worksheets)
+
+    def cycles(self):
+        """Strongly connected components with more than one node, or a node referencing itself.
+
+        Iterative Tarjan, O(V + E), so deep calculation chains don't hit the recursion limit.
+        """
+
+        index = {}
+        lowlink = {}
+        on_stack = set()
+        stack = []
+        components = []
+        counter = 0
+
+        for root in self.nodes:
+            if root in index:
+                continue
+            work = [(root, iter(self.successors[root]))]
+            index[root] = lowlink[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node_id, successors = work[-1]
+                advanced = False
+                for successor in successors:
+                    if successor not in index:
+                        index[successor] = lowlink[successor] = counter
+                        counter += 1
+                        stack.append(successor)
+                        on_stack.add(successor)
+                        work.append((successor, iter(self.successors[successor])))
+                        advanced = True
+                        break
+                    if successor in on_stack:
+                        lowlink[node_id] = min(lowlink[node_id], index[successor])
+                if advanced:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node_id])
+                if lowlink[node_id] == index[node_id]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node_id:
+                            break
+                    if len(component) > 1 or node_id in self.successors[node_id]:
+                        components.append(component[::-1])
+
+        return components
+
+    def describe(self, node_id):
+        """Plain-dict summary of a node with its upstream and downstream closures (JSON friendly)."""
+
+        def entries(distances):
+            return [{'id': other, 'field_id': self.nodes[other].get('field_id'), 'name': self.nodes[other]['label'],
+                     'distance': distance} for other, distance in distances.items()]
+
+        node = self.nodes[node_id]
+        return {
+            'id': node_id,
+            'field_id': node.get('field_id'),
+            'name': node['label'],
+            'datasource': node.get('datasource'),
+            'field_type': node.get('field_type'),
+            'depth': self.depth[node_id],
+            'upstream': entries(self.upstream(node_id)),
+            'downstream': entries(self.downstream(node_id)),
+            'affected_worksheets': self.affected_worksheets(node_id),
+        }
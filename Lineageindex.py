@@ -0,0 +1,270 @@
+"""
+Lineageindex.py
+
+Cross-workbook lineage index: one SQLite database for a whole Tableau estate, so questions
+like "which workbooks use field Y of published datasource X?" or "which calculations reference
+[Calculation_123]?" are answered with an indexed lookup instead of re-running the extractor.
+
+Tables (workbook -> datasource -> field -> references):
+- workbooks:          path, XML digest and extractor version of every indexed workbook
+- datasources:        name and caption of each datasource in a workbook
+- fields:             every field of every datasource with type and formula (a field defined in
+                      two datasources has a row under each)
+- field_references:   each bracketed reference in a calculation's raw formula
+- field_worksheets:   the worksheets each field is used in
+
+Indexing runs the extraction in a process pool (or reads it from the extraction cache) while
+the main process is the only SQLite writer. Rows are inserted with executemany, several
+workbooks per transaction. Updates are incremental: a workbook whose XML digest and extractor
+version match the stored ones is skipped, a changed one has its rows replaced, and with
+prune=True workbooks that no longer exist on disk are removed.
+"""
+
+import os
+import time
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import Extractorengine as eng
+import Extractioncache as xc
+
+
+# Workbooks written per transaction
+COMMIT_EVERY = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workbooks (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    digest TEXT NOT NULL,
+    extractor_version TEXT NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS datasources (
+    id INTEGER PRIMARY KEY,
+    workbook_id INTEGER NOT NULL REFERENCES workbooks(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    caption TEXT,
+    UNIQUE (workbook_id, name)
+);
+CREATE TABLE IF NOT EXISTS fields (
+    id INTEGER PRIMARY KEY,
+    workbook_id INTEGER NOT NULL REFERENCES workbooks(id) ON DELETE CASCADE,
+    datasource_id INTEGER NOT NULL REFERENCES datasources(id) ON DELETE CASCADE,
+    field_id TEXT NOT NULL,
+    name TEXT,
+    field_type TEXT,
+    datatype TEXT,
+    role TEXT,
+    formula TEXT,
+    raw_formula TEXT,
+    used_in_report INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS field_references (
+    field_id INTEGER NOT NULL REFERENCES fields(id) ON DELETE CASCADE,
+    workbook_id INTEGER NOT NULL REFERENCES workbooks(id) ON DELETE CASCADE,
+    referenced_field_id TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS field_worksheets (
+    field_id INTEGER NOT NULL REFERENCES fields(id) ON DELETE CASCADE,
+    worksheet TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS datasources_workbook ON datasources(workbook_id);
+CREATE INDEX IF NOT EXISTS datasources_name ON datasources(name);
+CREATE INDEX IF NOT EXISTS datasources_caption ON datasources(caption);
+CREATE INDEX IF NOT EXISTS fields_workbook ON fields(workbook_id);
+CREATE INDEX IF NOT EXISTS fields_datasource ON fields(datasource_id);
+CREATE INDEX IF NOT EXISTS fields_field_id ON fields(field_id);
+CREATE INDEX IF NOT EXISTS fields_name ON fields(name);
+CREATE INDEX IF NOT EXISTS field_references_field ON field_references(field_id);
+CREATE INDEX IF NOT EXISTS field_references_workbook ON field_references(workbook_id);
+CREATE INDEX IF NOT EXISTS field_references_referenced ON field_references(referenced_field_id);
+CREATE INDEX IF NOT EXISTS field_worksheets_field ON field_worksheets(field_id);
+CREATE INDEX IF NOT EXISTS field_worksheets_worksheet ON field_worksheets(worksheet);
+"""
+
+
+def connect(db_path):
+    """Open (creating if needed) an index database."""
+
+    connection = sqlite3.connect(db_path)
+    connection.execute('PRAGMA foreign_keys = ON')
+    connection.execute('PRAGMA journal_mode = WAL')
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def indexed_fields(df_fields):
+    """The rows of Extractorengine.datasource_fields() the index stores: each field once per datasource.
+
+    Unlike the report table, a field defined in several datasources keeps a row in each. Copies of
+    parameters listed again under other datasources and raw relation columns (IDs without
+    brackets) are dropped, as in extract_calculations().
+    """
+
+    df_fields = df_fields[eng.has_bracketed_id(df_fields['field_id'])]
+    is_parameter = df_fields['field_type'] == 'Parameters'
+    keys = pd.MultiIndex.from_frame(df_fields[['field_id', 'field_calculation']])
+    parameter_copy = ~is_parameter & keys.isin(keys[is_parameter.to_numpy()])
+    return df_fields[~parameter_copy].drop_duplicates(['datasource_name', 'field_id', 'field_calculation'])
+
+
+def workbook_rows(workbook_path, known_digest=None, streaming=False, cache=None):
+    """Everything the index stores for one workbook, computed in a pool worker. Never raises.
+
+    Returns {'status': 'unchanged'} when the XML digest equals known_digest.
+    """
+
+    try:
+        digest = xc.workbook_digest(workbook_path)
+        if digest == known_digest:
+            return {'workbook': workbook_path, 'status': 'unchanged'}
+
+        df_fields = indexed_fields(eng.load_datasource_fields(workbook_path, streaming=streaming, cache=cache, digest=digest))
+        datasources = list(dict(zip(df_fields['datasource_name'], df_fields['datasource_caption'])).items())
+        fields = []
+        for row in zip(df_fields['datasource_name'], df_fields['field_id'],
+                       df_fields['field_name'].str.replace(r'[\[\]]', '', regex=True),
+                       df_fields['field_type'].astype(str), df_fields['field_datatype'], df_fields['field_role'],
+                       df_fields['field_calculation'], df_fields['field_calculation_bk'], df_fields['field_worksheets']):
+            datasource_name, field_id, name, field_type, datatype, role, formula, raw_formula, worksheets = row
+            fields.append((datasource_name, field_id, name, field_type, datatype, role, formula, raw_formula,
+                           list(worksheets or ()), eng.formula_references(raw_formula)))
+        return {'workbook': workbook_path, 'status': 'ok', 'digest': digest,
+                'datasources': datasources, 'fields': fields}
+    except Exception as e:
+        return {'workbook': workbook_path, 'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+
+
+def _write_workbook(connection, result, indexed_at):
+    # Replace every row of the workbook (ON DELETE CASCADE removes its datasources, fields and references)
+    connection.execute('DELETE FROM workbooks WHERE path = ?', (result['workbook'],))
+    workbook_id = connection.execute(
+        'INSERT INTO workbooks (path, digest, extractor_version, indexed_at) VALUES (?, ?, ?, ?)',
+        (result['workbook'], result['digest'], eng.EXTRACTOR_VERSION, indexed_at)).lastrowid
+
+    datasource_ids = {}
+    for name, caption in result['datasources']:
+        datasource_ids[name] = connection.execute(
+            'INSERT INTO datasources (workbook_id, name, caption) VALUES (?, ?, ?)',
+            (workbook_id, name, caption)).lastrowid
+
+    # Field ids are assigned here rather than by SQLite, so the reference and worksheet rows
+    # can be built without reading them back (this connection is the only writer)
+    first_field_id = connection.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM fields').fetchone()[0]
+    connection.executemany(
+        'INSERT INTO fields (id, workbook_id, datasource_id, field_id, name, field_type, datatype, role, formula, '
+        'raw_formula, used_in_report) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        [(first_field_id + offset, workbook_id, datasource_ids[f[0]], f[1], f[2], f[3], f[4], f[5], f[6], f[7],
+          int(bool(f[8]))) for offset, f in enumerate(result['fields'])])
+
+    references = []
+    worksheets = []
+    for offset, field in enumerate(result['fields']):
+        field_pk = first_field_id + offset
+        worksheets.extend((field_pk, worksheet) for worksheet in field[8])
+        references.extend((field_pk, workbook_id, reference) for reference in field[9])
+    connection.executemany('INSERT INTO field_references (field_id, workbook_id, referenced_field_id) VALUES (?, ?, ?)',
+                           references)
+    connection.executemany('INSERT INTO field_worksheets (field_id, worksheet) VALUES (?, ?)', worksheets)
+
+
+def index_workbooks(db_path, paths, workers=None, streaming=False, cache=None, prune=False):
+    """Add or refresh every workbook under paths (files or directories) in the index at db_path.
+
+    Returns a summary dict with the number of workbooks added/updated, unchanged, failed and removed.
+    """
+
+    workbook_paths = []
+    for path in paths:
+        found = eng.find_tableau_files(path) if os.path.isdir(path) else [path]
+        workbook_paths.extend(os.path.abspath(p) for p in found)
+
+    connection = connect(db_path)
+    # Digests only count as unchanged when they were indexed by the same extractor version
+    known = dict(connection.execute('SELECT path, digest FROM workbooks WHERE extractor_version = ?',
+                                    (eng.EXTRACTOR_VERSION,)))
+
+    start_time = time.perf_counter()
+    summary = {'indexed': 0, 'unchanged': 0, 'failed': 0, 'removed': 0, 'errors': []}
+    pending = []
+
+    def flush():
+        with connection:
+            indexed_at = time.time()
+            for result in pending:
+                _write_workbook(connection, result, indexed_at)
+        pending.clear()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(workbook_rows, p, known.get(p), streaming, cache) for p in workbook_paths]
+        for future in as_completed(futures):
+            result = future.result()
+            if result['status'] == 'unchanged':
+                summary['unchanged'] += 1
+            elif result['status'] == 'error':
+                summary['failed'] += 1
+                summary['errors'].append({'workbook': result['workbook'], 'error': result['error']})
+            else:
+                summary['indexed'] += 1
+                pending.append(result)
+                if len(pending) >= COMMIT_EVERY:
+                    flush()
+    flush()
+
+    if prune:
+        missing = [(path,) for (path,) in connection.execute('SELECT path FROM workbooks') if not os.path.exists(path)]
+        with connection:
+            connection.executemany('DELETE FROM workbooks WHERE path = ?', missing)
+        summary['removed'] = len(missing)
+
+    connection.close()
+    summary['seconds'] = round(time.perf_counter() - start_time, 3)
+    return summary
+
+
+def find_field_usage(db_path, field, datasource=None):
+    """Workbooks containing a field, by name or field ID, optionally limited to a datasource name or caption.
+
+    Returns dicts with workbook, datasource, field and usage details, plus the calculations in the
+    same workbook that reference the field.
+    """
+
+    field_id = field if field.startswith('[') else f'[{field}]'
+    query = ('SELECT f.id, d.id, w.path, d.name, d.caption, f.field_id, f.name, f.field_type, f.used_in_report '
+             'FROM fields f JOIN datasources d ON d.id = f.datasource_id JOIN workbooks w ON w.id = f.workbook_id '
+             'WHERE (f.field_id = ? OR f.name = ?)')
+    params = [field_id, field.strip('[]')]
+    if datasource is not None:
+        query += ' AND (d.name = ? OR d.caption = ?)'
+        params += [datasource, datasource]
+    query += ' ORDER BY w.path, d.name'
+
+    connection = connect(db_path)
+    try:
+        results = []
+        for pk, ds_pk, path, ds_name, ds_caption, matched_id, name, field_type, used in connection.execute(query, params).fetchall():
+            # Calculations reference fields of their own datasource; parameters are shared by all of them
+            referenced_by = connection.execute(
+                'SELECT c.field_id, c.name FROM field_references r JOIN fields c ON c.id = r.field_id '
+                'WHERE r.workbook_id = (SELECT workbook_id FROM fields WHERE id = ?) AND r.referenced_field_id = ? '
+                "AND (c.datasource_id = ? OR ? = 'Parameters') ORDER BY c.name",
+                (pk, matched_id, ds_pk, field_type)).fetchall()
+            worksheets = [w for (w,) in connection.execute(
+                'SELECT worksheet FROM field_worksheets WHERE field_id = ? ORDER BY worksheet', (pk,))]
+            results.append({
+                'workbook': path,
+                'datasource': ds_name,
+                'datasource_caption': ds_caption,
+                'field_id': matched_id,
+                'name': name,
+                'field_type': field_type,
+                'used_in_report': bool(used),
+                'worksheets': worksheets,
+                'referenced_by': [{'field_id': ref_id, 'name': ref_name} for ref_id, ref_name in referenced_by],
+            })
+        return results
+    finally:
+        connection.close()
@@ -0,0 +1,203 @@
+"""
+Lineagelayout.py
+
+Server-side layout for the lineage diagram.
+
+The diagram used to let vis.js work out a hierarchical layout ('directed' sort) in the browser
+when the page loads, which freezes or crashes the tab once a workbook has a few thousand fields.
+Here the layout is computed in Python instead and written into the page as fixed positions:
+
+- every node gets a level by longest-path layering over the dependency graph (a field sits one
+  level right of its deepest input), which is what the 'directed' sort produced;
+- nodes within a level are ordered by the average position of their inputs (one barycenter
+  sweep), which keeps most edges short and uncrossed;
+- graphs larger than CLUSTER_THRESHOLD nodes are split into clusters (by datasource, or by
+  connected component when everything sits in one datasource). Each cluster is laid out in its
+  own horizontal band and the page shows one node per cluster until it is clicked.
+"""
+
+from collections import defaultdict, deque
+
+
+# Spacing between levels (x) and between nodes within a level (y), same as the old vis.js options
+LEVEL_SEPARATION = 200
+NODE_SPACING = 150
+
+# Extra vertical gap between cluster bands
+CLUSTER_GAP = 300
+
+# Graphs with more nodes than this open collapsed into clusters
+CLUSTER_THRESHOLD = 1000
+
+# Label of the cluster that collects fields with no dependencies at all
+UNCONNECTED_CLUSTER_LABEL = 'Unconnected fields'
+
+
+def longest_path_levels(node_ids, edges):
+    """Level of every node: 0 for nodes without inputs, otherwise 1 + the deepest input's level.
+
+    Uses Kahn's topological order, so it runs in O(V + E). Calculations can't reference each
+    other in a loop in Tableau, but if the edge list has a cycle anyway, the nodes on it are
+    placed after their already-levelled inputs instead of failing.
+    """
+
+    predecessors = defaultdict(list)
+    successors = defaultdict(list)
+    in_degree = dict.fromkeys(node_ids, 0)
+    for edge in edges:
+        source, target = edge['from'], edge['to']
+        if source in in_degree and target in in_degree and source != target:
+            predecessors[target].append(source)
+            successors[source].append(target)
+            in_degree[target] += 1
+
+    levels = {}
+    queue = deque(n for n in node_ids if in_degree[n] == 0)
+    while queue:
+        node = queue.popleft()
+        levels[node] = max((levels[p] + 1 for p in predecessors[node]), default=0)
+        for successor in successors[node]:
+            in_degree[successor] -= 1
+            if in_degree[successor] == 0:
+                queue.append(successor)
+
+    # Nodes left over are on (or behind) a cycle
+    for node in node_ids:
+        if node not in levels:
+            levels[node] = max((levels[p] + 1 for p in predecessors[node] if p in levels), default=0)
+
+    return levels, predecessors
+
+
+def connected_components(node_ids, edges):
+    """Component number of every node, treating edges as undirected (union-find)."""
+
+    parent = {n: n for n in node_ids}
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for edge in edges:
+        source, target = edge['from'], edge['to']
+        if source in parent and target in parent:
+            root_source, root_target = find(source), find(target)
+            if root_source != root_target:
+                parent[root_target] = root_source
+
+    numbers = {}
+    return {n: numbers.setdefault(find(n), len(numbers)) for n in node_ids}
+
+
+def cluster_keys(nodes, edges):
+    """Group nodes for the collapsed view.
+
+    Returns (keys, labels): the cluster key of every node ID and a display label per key.
+    Datasources are used when there is more than one; otherwise connected components, with
+    all single-node components put together in one 'Unconnected fields' cluster.
+    """
+
+    # dict rather than set, so clusters come out in node order on every run
+    datasources = dict.fromkeys(n.get('datasource') for n in nodes)
+    if len(datasources) > 1:
+        keys = {n['id']: 'ds:' + str(n.get('datasource')) for n in nodes}
+        labels = {'ds:' + str(ds): str(ds) for ds in datasources}
+        return keys, labels
+
+    node_ids = [n['id'] for n in nodes]
+    components = connected_components(node_ids, edges)
+    sizes = defaultdict(int)
+    for number in components.values():
+        sizes[number] += 1
+
+    keys = {}
+    labels = {}
+    for node_id in node_ids:
+        number = components[node_id]
+        if sizes[number] == 1:
+            key, label = 'unconnected', UNCONNECTED_CLUSTER_LABEL
+        else:
+            key, label = f'cc:{number}', f'Lineage group {len(labels) + 1}'
+        keys[node_id] = key
+        labels.setdefault(key, label)
+    return keys, labels
+
+
+def layout_lineage(nodes, edges, cluster_threshold=CLUSTER_THRESHOLD):
+    """Compute fixed positions for the diagram.
+
+    Returns (positioned_nodes, clusters). positioned_nodes are copies of the node dicts with
+    'level', 'x' and 'y' added (and 'cluster' when the graph is clustered); clusters is a list
+    of {'id', 'label', 'title', 'size', 'x', 'y'} dicts, empty for graphs at or below
+    cluster_threshold nodes.
+    """
+
+    node_ids = [n['id'] for n in nodes]
+    levels, predecessors = longest_path_levels(node_ids, edges)
+
+    clustered = len(nodes) > cluster_threshold
+    if clustered:
+        keys, labels = cluster_keys(nodes, edges)
+    else:
+        keys, labels = dict.fromkeys(node_ids, None), {None: None}
+
+    # Members of each band, in node order
+    bands = defaultdict(list)
+    for node_id in node_ids:
+        bands[keys[node_id]].append(node_id)
+
+    positions = {}
+    clusters = []
+    band_top = 0
+    for key in labels:
+        members = bands[key]
+        if not members:
+            continue
+
+        by_level = defaultdict(list)
+        for node_id in members:
+            by_level[levels[node_id]].append(node_id)
+
+        # Order each level by the mean rank of the inputs already placed (barycenter sweep, left to right)
+        rank = {}
+        band_height = 0
+        for level in sorted(by_level):
+            def barycenter(node_id):
+                placed = [rank[p] for p in predecessors[node_id] if p in rank]
+                return sum(placed) / len(placed) if placed else -1
+
+            ordered = sorted(by_level[level], key=barycenter)
+            for position, node_id in enumerate(ordered):
+                rank[node_id] = position
+                positions[node_id] = (level * LEVEL_SEPARATION, band_top + position * NODE_SPACING)
+            band_height = max(band_height, len(ordered))
+
+        if clustered:
+            xs = [positions[n][0] for n in members]
+            clusters.append({
+                'id': key,
+                'label': f'{labels[key]} ({len(members)} fields)',
+                'title': f'{labels[key]}\n{len(members)} fields - click to expand',
+                'size': len(members),
+                'x': (min(xs) + max(xs)) / 2,
+                'y': band_top + (band_height - 1) * NODE_SPACING / 2,
+            })
+        band_top += band_height * NODE_SPACING + CLUSTER_GAP
+
+    positioned_nodes = []
+    for node in nodes:
+        x, y = positions[node['id']]
+        positioned_nodes.append(positioned_node(node, levels[node['id']], x, y, keys[node['id']] if clustered else None))
+
+    return positioned_nodes, clusters
+
+
+def positioned_node(node, level, x, y, cluster=None):
+    """Copy of a node dict with its layout added: 'level', 'x', 'y' and, in a clustered graph, 'cluster'."""
+
+    positioned = dict(node, level=level, x=x, y=y)
+    if cluster is not None:
+        positioned['cluster'] = cluster
+    return positioned
@@ -0,0 +1,145 @@
+"""
+Stageprofiler.py
+
+Per-stage instrumentation of a pipeline run, so a slow workbook shows where its time and
+memory go (XML loading, DataFrame work, lineage matching or writing the outputs).
+
+A StageProfiler is started and stopped around each stage (process_workbook does this in
+its enter_stage hook) and records, per stage:
+- wall-clock seconds (time.perf_counter)
+- resident set size at the end of the stage and the process peak RSS so far
+- with trace_memory, Python allocations still held and the peak reached during the stage (tracemalloc)
+- with cprofile, the functions with the highest cumulative time (cProfile)
+
+report() returns all of it as a JSON-friendly dict. When profiling is off no profiler is
+created at all and the pipeline only pays for an `is not None` check per stage.
+"""
+
+import os
+import sys
+import time
+import pstats
+import cProfile
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# --profile modes: timers and RSS only, plus tracemalloc, or plus cProfile
+PROFILE_MODES = ('time', 'memory', 'cprofile')
+
+# Functions listed per stage in cProfile mode
+TOP_FUNCTIONS = 15
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None where /proc is not available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or None without the resource module."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class StageProfiler(object):
+    """ Stage timers with optional tracemalloc and cProfile capture """
+
+    def __init__(self, trace_memory=False, cprofile=False):
+        self.trace_memory = trace_memory
+        self.cprofile = cprofile
+        self.stages = []
+        self._current = None
+        self._profiles = []
+        self._started_tracemalloc = False
+        self._start_time = time.perf_counter()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    @classmethod
+    def for_mode(cls, mode):
+        """Profiler for one of PROFILE_MODES, or None when mode is None."""
+        if mode is None:
+            return None
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}', expected one of {', '.join(PROFILE_MODES)}")
+        return cls(trace_memory=mode == 'memory', cprofile=mode == 'cprofile')
+
+    def start(self, name):
+        """Start timing stage name, ending the stage that is running."""
+
+        self.stop()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        profile = None
+        if self.cprofile:
+            profile = cProfile.Profile()
+            profile.enable()
+        self._current = (name, time.perf_counter(), profile)
+
+    def stop(self):
+        """End the running stage, if any, and record its measurements."""
+
+        if self._current is None:
+            return
+        name, start, profile = self._current
+        self._current = None
+        if profile is not None:
+            profile.disable()
+        seconds = time.perf_counter() - start
+
+        stage = {'stage': name, 'seconds': round(seconds, 4), 'rss_bytes': current_rss(), 'peak_rss_bytes': peak_rss()}
+        if self.trace_memory:
+            traced, traced_peak = tracemalloc.get_traced_memory()
+            stage['traced_bytes'] = traced
+            stage['traced_peak_bytes'] = traced_peak
+        if profile is not None:
+            stage['top_functions'] = _top_functions(pstats.Stats(profile))
+            self._profiles.append(profile)
+        self.stages.append(stage)
+
+    def finish(self):
+        """End the running stage and stop tracemalloc if this profiler started it."""
+
+        self.stop()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def report(self):
+        """Every recorded stage plus run totals, as a JSON-friendly dict."""
+
+        return {
+            'mode': 'cprofile' if self.cprofile else 'memory' if self.trace_memory else 'time',
+            'seconds': round(time.perf_counter() - self._start_time, 4),
+            'peak_rss_bytes': peak_rss(),
+            'stages': list(self.stages),
+        }
+
+    def dump_stats(self, path):
+        """Write the cProfile data of all stages as one .prof file (for pstats or snakeviz). False if there is none."""
+
+        if not self._profiles:
+            return False
+        pstats.Stats(*self._profiles).dump_stats(path)
+        return True
+
+
+def _top_functions(stats, limit=TOP_FUNCTIONS):
+    # Functions with the highest cumulative time, as plain dicts
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [{'function': f'{os.path.basename(filename)}:{line}({function})', 'calls': calls,
+             'own_seconds': round(own, 4), 'cumulative_seconds': round(cumulative, 4)}
+            for (filename, line, function), (_, calls, own, cumulative, _) in rows]
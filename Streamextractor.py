@@ -0,0 +1,296 @@
+"""
+Streamextractor.py
+
+Single-pass streaming reader for Tableau workbooks, used instead of the Document API's Workbook().
+
+Workbook() builds the whole document tree (worksheets, dashboards, styles, thumbnails) before
+we can read a single field. This module walks the XML once with lxml's iterparse, keeps only
+what build_collator() needs (datasources, their <column>/<metadata-record> elements and the
+worksheet field references) and frees every element as soon as it has been read, so peak
+memory stays bounded by the largest single datasource rather than by the file size.
+
+The objects returned mimic the parts of the Document API that the engine uses
+(workbook.datasources, datasource.name/caption/fields, field.id/calculation/worksheets/...),
+so the rest of the pipeline does not need to know which loader produced them.
+
+Run this module with a workbook path to check it against the Document API:
+    python Streamextractor.py inputs/MyWorkbook.twbx
+"""
+
+import sys
+import zipfile
+import contextlib
+
+from lxml import etree as ET
+
+
+class StreamedField(object):
+    """ Field attributes read from a <column> or <metadata-record> element """
+
+    def __init__(self, id=None, caption=None, datatype=None, role=None, type=None, alias=None,
+                 calculation=None, description=None, hidden=None):
+        self.id = id
+        self.caption = caption
+        self.datatype = datatype
+        self.role = role
+        self.type = type
+        self.alias = alias
+        self.calculation = calculation
+        self.description = description
+        self.hidden = hidden
+        self.default_aggregation = None
+        # dict used as an ordered set, so worksheet order follows the document
+        self._worksheets = {}
+
+    @classmethod
+    def from_column_xml(cls, column):
+        calc = column.find('.//calculation')
+        desc = column.find('.//desc')
+        if desc is not None:
+            desc = ET.tostring(desc, encoding='utf-8').decode('utf-8')
+        attrib = column.attrib
+        return cls(id=attrib.get('name'), caption=attrib.get('caption'), datatype=attrib.get('datatype'),
+                   role=attrib.get('role'), type=attrib.get('type'), alias=attrib.get('alias'),
+                   calculation=calc.get('formula') if calc is not None else None,
+                   description=desc, hidden=attrib.get('hidden'))
+
+    @classmethod
+    def from_metadata_record(cls, record):
+        field = cls(id=record['local-name'], datatype=record['local-type'], alias=record['remote-alias'])
+        field.default_aggregation = record['aggregation']
+        return field
+
+    @property
+    def name(self):
+        """ Alias if defined, otherwise caption, otherwise id (same rule as the Document API) """
+        return self.alias or self.caption or self.id
+
+    @property
+    def is_quantitative(self):
+        return self.type == 'quantitative'
+
+    @property
+    def is_ordinal(self):
+        return self.type == 'ordinal'
+
+    @property
+    def is_nominal(self):
+        return self.type == 'nominal'
+
+    @property
+    def worksheets(self):
+        return list(self._worksheets)
+
+    def add_used_in(self, name):
+        self._worksheets[name] = None
+
+
+class StreamedDatasource(object):
+    """ A top-level <datasource> and its fields keyed by field id """
+
+    def __init__(self, name, caption):
+        self.name = name
+        self.caption = caption
+        self.fields = {}
+        self._columns = []
+        self._metadata_records = []
+
+    def _finish(self):
+        # Same precedence as the Document API: <column> elements first (later duplicates win,
+        # first position is kept), then metadata-records that have no matching <column>.
+        first_record = {}
+        for record in self._metadata_records:
+            first_record.setdefault(record['local-name'], record)
+
+        for field in self._columns:
+            record = first_record.get(field.id)
+            if record is not None:
+                field.default_aggregation = record['aggregation']
+            self.fields[field.id] = field
+
+        column_ids = set(f.id for f in self._columns)
+        for record in self._metadata_records:
+            if record['local-name'] not in column_ids:
+                self.fields[record['local-name']] = StreamedField.from_metadata_record(record)
+
+        self._columns = None
+        self._metadata_records = None
+
+
+class StreamedWorkbook(object):
+    """ Result of stream_workbook(): datasources with fields and worksheet usage filled in """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.datasources = []
+        self.worksheets = []
+
+
+_METADATA_CHILDREN = ('local-name', 'local-type', 'remote-alias', 'aggregation')
+
+
+def _read_metadata_record(record):
+    values = {}
+    for tag in _METADATA_CHILDREN:
+        child = record.find('.//{}'.format(tag))
+        values[tag] = child.text if child is not None else None
+    return values
+
+
+def _free(elem):
+    # Drop the element's content and any already-processed siblings before it
+    elem.clear()
+    parent = elem.getparent()
+    if parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
+
+
+def parse_workbook_stream(source, filename=None):
+    """Stream a .twb XML document (path or binary file object) into a StreamedWorkbook."""
+
+    workbook = StreamedWorkbook(filename or getattr(source, 'name', source))
+    usages = []
+
+    stack = []
+    datasource = None      # top-level <datasource> currently open
+    worksheet = None       # <worksheet> currently open
+    dependency_ds = None   # datasource attribute of the open <datasource-dependencies>
+    capture_depth = 0      # open elements whose subtree we still need to read
+
+    for event, elem in ET.iterparse(source, events=('start', 'end'), huge_tree=True):
+        tag = elem.tag
+
+        if event == 'start':
+            stack.append(tag)
+            depth = len(stack)
+
+            if depth == 1:
+                if tag != 'workbook':
+                    raise RuntimeError(f"'{workbook.filename}' is not a valid 'workbook' file")
+            elif depth == 3 and tag == 'datasource' and stack[1] == 'datasources':
+                datasource = StreamedDatasource(elem.get('name') or elem.get('formatted-name'), elem.get('caption', ''))
+            elif depth == 3 and tag == 'worksheet' and stack[1] == 'worksheets':
+                worksheet = elem.get('name')
+                workbook.worksheets.append(worksheet)
+            elif tag == 'datasource-dependencies' and worksheet is not None:
+                dependency_ds = elem.get('datasource')
+
+            if datasource is not None and (tag == 'column' or (tag == 'metadata-record' and elem.get('class') == 'column')):
+                capture_depth += 1
+            continue
+
+        # end event
+        depth = len(stack)
+        stack.pop()
+
+        if datasource is not None:
+            if tag == 'column':
+                datasource._columns.append(StreamedField.from_column_xml(elem))
+                capture_depth -= 1
+            elif tag == 'metadata-record' and elem.get('class') == 'column':
+                datasource._metadata_records.append(_read_metadata_record(elem))
+                capture_depth -= 1
+            elif depth == 3 and tag == 'datasource':
+                datasource._finish()
+                workbook.datasources.append(datasource)
+                datasource = None
+        elif worksheet is not None:
+            if tag == 'column' and dependency_ds is not None:
+                usages.append((dependency_ds, elem.get('name'), worksheet))
+            elif tag == 'datasource-dependencies':
+                dependency_ds = None
+            elif depth == 3 and tag == 'worksheet':
+                worksheet = None
+
+        if capture_depth == 0:
+            _free(elem)
+
+    ds_index = {ds.name: ds for ds in workbook.datasources}
+    for ds_name, column_name, worksheet_name in usages:
+        ds = ds_index.get(ds_name)
+        if ds is not None and column_name in ds.fields:
+            ds.fields[column_name].add_used_in(worksheet_name)
+
+    return workbook
+
+
+def find_twb_member(zip_file):
+    """Name of the workbook XML inside an open .twbx ZipFile."""
+    twb_name = next((n for n in zip_file.namelist() if n.lower().endswith('.twb')), None)
+    if twb_name is None:
+        raise RuntimeError(f"No .twb found inside packaged workbook: {zip_file.filename}")
+    return twb_name
+
+
+@contextlib.contextmanager
+def open_twb_stream(workbook_path):
+    """Yield a binary stream of the workbook XML.
+
+    Packaged workbooks are detected from the zip signature, not the extension, and the inner
+    .twb is read straight from its ZipFile member (decompressed on the fly, never written to disk).
+    """
+
+    if zipfile.is_zipfile(workbook_path):
+        with zipfile.ZipFile(workbook_path, 'r') as z:
+            with z.open(find_twb_member(z)) as twb_file:
+                yield twb_file
+    else:
+        with open(workbook_path, 'rb') as twb_file:
+            yield twb_file
+
+
+def stream_workbook(workbook_path):
+    """Stream a .twb, or the .twb inside a .twbx, into a StreamedWorkbook."""
+
+    with open_twb_stream(workbook_path) as twb_file:
+        return parse_workbook_stream(twb_file, workbook_path)
+
+
+# Attributes compared by verify_against_document_api (everything build_collator reads)
+FIELD_ATTRIBUTES = ['alias', 'calculation', 'caption', 'datatype', 'default_aggregation', 'description',
+                    'hidden', 'id', 'is_nominal', 'is_ordinal', 'is_quantitative', 'name', 'role', 'type']
+
+
+def verify_against_document_api(workbook_path, document_api_workbook=None):
+    """Compare the streamed fields with Document API's Workbook() for the same file.
+
+    Returns a list of human readable differences (empty when both agree). Worksheet lists are
+    compared as sets because the Document API keeps them in an unordered set.
+    """
+
+    if document_api_workbook is None:
+        import Extractorengine as eng
+        document_api_workbook = eng.load_workbook(workbook_path)
+    streamed = stream_workbook(workbook_path)
+
+    differences = []
+    expected_ds = [(ds.name, ds.caption) for ds in document_api_workbook.datasources]
+    actual_ds = [(ds.name, ds.caption) for ds in streamed.datasources]
+    if expected_ds != actual_ds:
+        differences.append(f"datasources differ: {expected_ds} != {actual_ds}")
+        return differences
+
+    for expected, actual in zip(document_api_workbook.datasources, streamed.datasources):
+        if list(expected.fields) != list(actual.fields):
+            differences.append(f"{expected.name}: field ids differ: {list(expected.fields)} != {list(actual.fields)}")
+            continue
+        for field_id, expected_field in expected.fields.items():
+            actual_field = actual.fields[field_id]
+            for attr in FIELD_ATTRIBUTES:
+                if getattr(expected_field, attr) != getattr(actual_field, attr):
+                    differences.append(f"{expected.name} {field_id}.{attr}: "
+                                       f"{getattr(expected_field, attr)!r} != {getattr(actual_field, attr)!r}")
+            if set(expected_field.worksheets) != set(actual_field.worksheets):
+                differences.append(f"{expected.name} {field_id}.worksheets: "
+                                   f"{sorted(expected_field.worksheets)} != {sorted(actual_field.worksheets)}")
+
+    return differences
+
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        diffs = verify_against_document_api(path)
+        print(f"{path}: {'OK' if not diffs else f'{len(diffs)} differences'}")
+        for d in diffs:
+            print('  ' + d)
@@ -1,12 +1,12 @@
+import os, sys, json, argparse
 
-import pandas as pd, os, re, string, webbrowser
-
-from tableaudocumentapi import Workbook
 from os.path import isfile, join
 
-import Excelcreator as exg
-
-pd.set_option('display.max_columns', None)
+import Extractorengine as eng
+import Lineageindex as lix
+import Graphexporter as gx
+import Extractioncache as xc
+import Stageprofiler as sp
 
 
 # ## File Handling
@@ -15,643 +15,188 @@ pd.set_option('display.max_columns', None)
 input_path = "inputs"
 output_path = "outputs"
 
-mypath = "./{}".format(input_path)   #./ points to "this path" as a relative path
-
-#only gets files and not directories within the inputs folder 
-input_files = [f for f in os.listdir(mypath) if isfile(join(mypath, f))] 
-input_files
-
-
-
-def removeSpecialCharFromStr(spstring):
-    
-#     """
-#     input: string
-#     output: new string, without any special char
-#     """
-    
-    return ''.join(e for e in spstring if e.isalnum())
-
-
-def removeSpecialCharFromStr_leaveSpaces(spstring):
-  
-    return ''.join(e for e in spstring if (e.isalnum() or e ==' '))
-
-
-def remove_sp_char_then_turn_spaces_into_underscore(string_to_convert):
-    filtered_string = re.sub(r'[^a-zA-Z0-9\s_]', '', string_to_convert).replace(' ', "_")
-    return filtered_string
-
-
-def remove_sp_char_leave_undescore_square_brackets(string_to_convert):
-    # Clean special characters from strings while keeping underscores and square brackets
-    filtered_string = re.sub(r'[^a-zA-Z0-9\s._\[\]]', '', string_to_convert).replace(' ', "_")
-    return filtered_string
-
-def find_tableau_file(inputfile):
-    """Return the input filename if it is a .twb or .twbx, else return empty string.
-
-    This does not rename files. It simply filters supported types.
-    """
-
-    if inputfile.lower().endswith('.twb') or inputfile.lower().endswith('.twbx'):
-        return inputfile
-    return ""
 
-
-selected_file = None
-for i in input_files:
-    candidate = find_tableau_file(i)
-    if candidate:
-        selected_file = candidate
-        break
-
-if not selected_file:
-    raise FileNotFoundError(f"No .twb or .twbx file found in '{input_path}'")
-
-print('Selected Tableau file: ' + selected_file)
-
-# substring to be used when naming the exported data (strip extension)
-tableau_name_substring = os.path.splitext(selected_file)[0][:30]
-print('\nOutput docs name: ' + tableau_name_substring)
-
-packagedTableauFile_relPath = os.path.join(input_path, selected_file)
-
-# # Doc API
-# get all fields in workbook
-# Attempt to open as a plain .twb first; if that fails and file is a .twbx, try to extract the .twb from it.
-TWBX_Workbook = None
-try:
-    TWBX_Workbook = Workbook(packagedTableauFile_relPath)
-except Exception:
-    # If the file is a packaged workbook (.twbx), try to extract contained .twb
-    if packagedTableauFile_relPath.lower().endswith('.twbx'):
-        import zipfile, tempfile, shutil
-
-        with zipfile.ZipFile(packagedTableauFile_relPath, 'r') as z:
-            twb_name = next((n for n in z.namelist() if n.lower().endswith('.twb')), None)
-            if twb_name is None:
-                raise RuntimeError(f"No .twb found inside packaged workbook: {packagedTableauFile_relPath}")
-
-            tmpdir = tempfile.mkdtemp(prefix='twbx_extract_')
-            try:
-                z.extract(twb_name, tmpdir)
-                twb_path = os.path.join(tmpdir, twb_name)
-                TWBX_Workbook = Workbook(twb_path)
-            finally:
-                # clean up the extracted files
-                try:
-                    shutil.rmtree(tmpdir)
-                except Exception:
-                    pass
+def run_single(streaming=False, shared_assets=False, exports=(), cache=None, incremental=False, profile=None):
+    # Original behaviour: process the first .twb/.twbx found in the inputs folder
+    mypath = "./{}".format(input_path)   #./ points to "this path" as a relative path
+
+    #only gets files and not directories within the inputs folder
+    input_files = [f for f in os.listdir(mypath) if isfile(join(mypath, f))]
+
+    selected_file = None
+    for i in input_files:
+        candidate = eng.find_tableau_file(i)
+        if candidate:
+            selected_file = candidate
+            break
+
+    if not selected_file:
+        raise FileNotFoundError(f"No .twb or .twbx file found in '{input_path}'")
+
+    print('Selected Tableau file: ' + selected_file)
+
+    packagedTableauFile_relPath = os.path.join(input_path, selected_file)
+    print('\nOutput docs name: ' + eng.workbook_name_substring(selected_file))
+
+    output_dir = os.path.join(os.getcwd(), output_path)
+    summary = eng.process_workbook(packagedTableauFile_relPath, output_dir, open_browser=True,
+                                   streaming=streaming, assets_dir=output_dir if shared_assets else None,
+                                   exports=exports, cache=cache, incremental=incremental, profile=profile)
+
+    if summary['cached']:
+        print("Workbook unchanged since the last run: reused cached extraction results")
+    elif summary.get('changed_calculations') is not None:
+        print(f"Incremental run: {summary['changed_calculations']} calculation(s) recomputed")
+    if summary.get('reused_outputs'):
+        print(f"Unchanged outputs kept: {', '.join(summary['reused_outputs'])}")
+    if summary.get('patched_outputs'):
+        print(f"Outputs patched in place: {', '.join(summary['patched_outputs'])}")
+    print(f"Default fields used in report: {summary['default_fields_used']}")
+    print(f"Calculated fields used in report: {summary['calculated_fields_used']}")
+    print(f"Unused calculated fields: {len(summary['unused_calculations'])}")
+    if summary['transitively_unused_calculations']:
+        print(f"Calculated fields only used by unused calculations: {', '.join(summary['transitively_unused_calculations'])}")
+    print(f"Total nodes: {summary['nodes']}")
+    print(f"Total edges: {summary['edges']}")
+    print("Excel file successfully written to {}".format(summary['excel_path']))
+    print("HTML content successfully written to {}".format(summary['html_path']))
+    for paths in summary['export_paths'].values():
+        for path in paths:
+            print("Lineage data written to {}".format(path))
+
+    if profile:
+        print_profile(summary['profile'])
+        print("Profile report written to {}".format(summary['profile_path']))
+        if summary.get('cprofile_path'):
+            print("cProfile data written to {}".format(summary['cprofile_path']))
+
+    print("\n✓ Interactive lineage diagram created and opened in browser (OFFLINE MODE)")
+    if shared_assets:
+        print(f"✓ Vis.js library shared from {os.path.join(output_dir, eng.VISJS_FILENAME)} - keep it next to the diagram")
     else:
-        raise
-
-collator = []
-calcID = []
-calcID2 = []
-calcNames = []
-
-c = 0
-    
-for datasource in TWBX_Workbook.datasources:
-    datasource_name = datasource.name
-    datasource_caption = datasource.caption if datasource.caption else datasource_name
-
-    for count, field in enumerate(datasource.fields.values()):
-        dict_temp = {
-            'counter': c,
-            'datasource_name': datasource_name,
-            'datasource_caption': datasource_caption,
-            'alias': field.alias,
-            'field_calculation': field.calculation,
-            'field_calculation_bk': field.calculation,
-            'field_caption': field.caption,
-            'field_datatype': field.datatype,
-            'field_def_agg': field.default_aggregation,
-            'field_desc': field.description,
-            'field_hidden': field.hidden,
-            'field_id': field.id,
-            'field_is_nominal': field.is_nominal,
-            'field_is_ordinal': field.is_ordinal,
-            'field_is_quantitative': field.is_quantitative,
-            'field_name': field.name,
-            'field_role': field.role,
-            'field_type': field.type,
-            'field_worksheets': field.worksheets,
-            'field_WHOLE': field
-        }
-
-        if field.calculation is not None:
-            calcID.append(field.id)
-            calcNames.append(field.name)
-
-            f2 = field.id.replace(']', '').replace('[', '')
-            calcID2.append(f2)
-
-        c += 1
-        collator.append(dict_temp)
-
-def default_to_friendly_names2(formulaList,fieldToConvert, dictToUse):
-
-    for i in formulaList:
-        for tableauName, friendlyName in dictToUse.items():
-            try:
-                i[fieldToConvert] = (i[fieldToConvert]).replace(tableauName, friendlyName)
-            except:
-                a = 0
-       
-    return formulaList
-
-
-def category_field_type(row):
-    if row['datasource_name'] == 'Parameters':
-        val = 'Parameters'
-    elif row['field_calculation'] == None:
-        val = 'Default_Field'
-    else:
-        val = 'Calculated_Field'
-    return val
-
-def compare_fields(row):
-    if row['field_id'] == row['field_id2']:
-        val = 0
-    else:
-        val = 1
-    return val
-
-
-calcDict = dict(zip(calcID, calcNames))
-calcDict2 = dict(zip(calcID2, calcNames)) #raw fields without any []
-
-collator = default_to_friendly_names2(collator,'field_calculation',calcDict2)
-
-df_API_all = pd.DataFrame(collator)
-df_API_all['field_type'] = df_API_all.apply(category_field_type, axis=1)
-
-preference_list=['Parameters', 'Calculated_Field', 'Default_Field']
-df_API_all["field_type"] = pd.Categorical(df_API_all["field_type"], categories=preference_list, ordered=True)
-
-#get rid of duplicates for parameters, so only parameters from the explicit Parameters datasource are kept (as they are also listed again under the name of any other datasources)
-df_API_all = df_API_all.sort_values(["field_id","field_type"]).drop_duplicates(["field_id", 'field_calculation']) 
-
-df_API_all['field_id2'] = df_API_all['field_id'].str.replace(r'[\[\]]', '', regex=True)
-
-df_API_all['comparison'] = df_API_all.apply(compare_fields, axis=1)
-df_API_all = df_API_all[df_API_all['comparison'] == 1]
-
-df_API_all = df_API_all.drop(['field_id2', 'comparison'], axis=1)
-df_API_all.sort_values(['datasource_name', 'field_type', 'counter', 'field_name'])
-
-df1 = df_API_all[[ 'field_name', 'field_datatype','field_type',  'field_calculation',   'field_id', 'datasource_caption', 'field_worksheets']].copy()
-
-preference_list=[ 'Default_Field', 'Parameters', 'Calculated_Field']
-df1["field_type"] = pd.Categorical(df1["field_type"], categories=preference_list, ordered=True)
-df1 = df1.sort_values(['field_type'])
-
-df1.columns = ['Field_Name', 'DataType', 'Type', 'Calculation', 'Field_ID', 'Datasource', 'Worksheets']
-
-df1['Field_Name'] = df1['Field_Name'].str.replace(r'[\[\]]', '', regex=True)
-
-# Clean the Worksheets column - convert list to comma-separated string without brackets
-def format_worksheets(ws_list):
-    if ws_list and isinstance(ws_list, list) and len(ws_list) > 0:
-        # Join worksheet names with comma and space
-        return ', '.join(ws_list)
-    return ''
-
-df1['Worksheets'] = df1['Worksheets'].apply(format_worksheets)
-
-# Add column to indicate if field is used in any worksheet
-df1['Used_In_Report'] = df1['Worksheets'].apply(lambda x: 'Yes' if x else 'No')
-
-
-
-# ## Generating an excel file from a df (so the excel rows/cols can be formatted), then turning the excel into a pdf
-
-# Modify this part if you want to add more information/dfs to be saved as a separate sheet in excel
-# Column widths optimized for: Field_Name(25), DataType(12), Type(18), Calculation(60), Field_ID(30), Datasource(25), Worksheets(40), Used_In_Report(15)
-
-dfs_to_use = [{'excelSheetTitle': 'All fields extracted from DOC API', 'df_to_use':df1, 'mainColWidth':'' , 
-               'normalColWidth': [25, 12, 18, 60, 30, 25, 40, 15], 'sheetName': 'GeneralDetails', 'footer': 'Data_1 (DOC API)', 'papersize':9, 'color': '#fff0b3'}                
-             
-             ]
-
-#papersize: a3 = 8, a4 = 9
-
-output_dir = os.path.join(os.getcwd(), 'outputs')
-os.makedirs(output_dir, exist_ok=True)
-path_excel_file_to_create = os.path.join(output_dir, f"{tableau_name_substring}_Calculations_table.xlsx")
-
-exg.create_excel_from_dfs(dfs_to_use, path_excel_file_to_create)
-
-
-
-# # Start of lineage diagram module
-
-# Create abbreviated node IDs for the lineage diagram (AA, AB, AC, etc.)
-
-def first_char_checker(cell_value):
-    # Normalize field IDs by wrapping them with double underscores
-    if cell_value[0] != '[':
-        cell_value = '__' + cell_value + '__'
-    else:
-        cell_value = cell_value.replace('[', '__')
-        cell_value = cell_value.replace(']', '__')
-    return cell_value
-
-# Define abc list to use during lineage diagram creation
-abc = list(string.ascii_uppercase)
-collated_abc = []
-
-for i in abc:
-    for j in abc:
-        collated_abc.append(i+j)
-
-# Map default fields to short abbreviations (AA, AB, etc.) for the diagram
-# Filter to only include fields that are used in the report
-def_fields_df = df1[(df1['Type'] == 'Default_Field') & (df1['Used_In_Report'] == 'Yes')][['Field_ID', 'Field_Name']].copy()
-def_fields = def_fields_df['Field_ID'].apply(remove_sp_char_leave_undescore_square_brackets)
-def_fields_original_names = def_fields_df['Field_Name'].tolist()  # Keep original names for display
-
-print(f"Default fields used in report: {len(def_fields)}")
-
-abc_touse = collated_abc[0:len(def_fields)]
-
-def_fields_final = pd.DataFrame(list(zip(def_fields.tolist(), abc_touse, def_fields_original_names)), columns=['cleaned', 'abbrev', 'original'])
-def_fields_final['aa'] = def_fields_final['cleaned'].apply(lambda x: first_char_checker(x))
-
-mapping_dict_friendly_names = dict(zip(def_fields_final['cleaned'].tolist(), abc_touse))
-mapping_dict_original_names = dict(zip(abc_touse, def_fields_final['original'].tolist()))  # Map abbrev to original names
-mapping_dict = dict(zip(def_fields_final['aa'].tolist(), abc_touse))
-
-# Extract calculated fields and parameters, map them to abbreviated IDs (x___AA, x___AB, etc.)
-# Filter to only include fields that are used in the report
-created_calc = df_API_all[(df_API_all['field_type'] != 'Default_Field') & (df_API_all['field_worksheets'].apply(lambda x: x and len(x) > 0))]\
-                [['field_name', 'field_id', 'field_calculation', 'field_calculation_bk']].copy()
-
-print(f"Calculated fields used in report: {len(created_calc)}")
-
-nlsi = ['x___' + i for i in collated_abc]
-nlsi_to_use = nlsi[0:len(created_calc)]
-
-# Store original field names BEFORE cleaning
-created_calc['field_name_original'] = created_calc['field_name'].copy()
-
-created_calc['field_name'] = created_calc['field_name'].apply(remove_sp_char_leave_undescore_square_brackets)
-created_calc['aa'] = created_calc.apply(lambda row: first_char_checker(row['field_id']), axis=1)
-created_calc['field_calculation_bk'] = created_calc['field_calculation_bk'].str.replace(r'[\[\]]', '__', regex=True)
-
-# Create mapping dictionary for calculated field abbreviations
-calc_map_dict = dict(zip(created_calc['aa'].to_list(), nlsi_to_use))
-
-# Add abbreviated IDs to calculated fields dataframe and sort
-created_calc['shorthand_abc'] = created_calc['aa'].map(calc_map_dict)
-created_calc.sort_values(by='shorthand_abc', inplace=True)
-
-# Handle duplicate field names by adding numeric suffixes (e.g., Index, Index1, Index2)
-def differentiate_duplicates(series):
-    counts = series.groupby(series).cumcount() 
-    return series + counts.astype(str).replace('0', '')
-
-# differentiate field names that have duplicate values (eg. calc field Index appears twice in workbook, now it will be Index, Index1)
-created_calc['field_name'] = differentiate_duplicates(created_calc['field_name'])
-
-# Create final mapping of friendly field names to abbreviated IDs
-calc_map_dict_friendly_names = dict(zip(created_calc['field_name'], created_calc['shorthand_abc'] ))
-calc_map_dict_original_names = dict(zip(created_calc['shorthand_abc'], created_calc['field_name_original']))  # Map abbrev to original names
-
-# Identify dependencies between fields by analyzing which fields are used in calculation formulas
-def create_lineage_paths(df, field_type):
-    c = 0
-    t_collator = []
-
-    for i in df['aa']:
-        try:
-            tlist = created_calc[created_calc['field_calculation_bk'].str.contains(i, regex=False) == True]['aa'].to_list()
-        except:
-            tlist = []
-
-        if len(tlist) != 0:
-            for x in tlist:
-                newdict = {
-                    'count': c,
-                    'starting': i,
-                    'ending': x,
-                    'path_mermaid': i + " --> " + x
-                }
-                t_collator.append(newdict)
-                c = c + 1
-    
-    return t_collator
-
-# Find all dependencies for default fields
-t_collator_def_fields = create_lineage_paths(def_fields_final, 'default_field')
-
-# Find all dependencies for calculated fields
-t_collator_calcs = create_lineage_paths(created_calc, 'calculation')
-
-# Replace full field names in paths with abbreviated IDs to simplify the diagram
-for default_field, mapping_letter in mapping_dict.items():
-    for i in t_collator_def_fields:
-        i['path_mermaid'] = i['path_mermaid'].replace(default_field, mapping_letter)
-
-for default_field, mapping_letter in calc_map_dict.items():
-    for i in t_collator_def_fields:
-        i['path_mermaid'] = i['path_mermaid'].replace(default_field, mapping_letter)
-
-for default_field, mapping_letter in mapping_dict.items():
-    for i in t_collator_calcs:
-        i['path_mermaid'] = i['path_mermaid'].replace(default_field, mapping_letter)
-
-for default_field, mapping_letter in calc_map_dict.items():
-    for i in t_collator_calcs:
-        i['path_mermaid'] = i['path_mermaid'].replace(default_field, mapping_letter)
-
-print(f"Processed {len(t_collator_def_fields)} default field paths")
-print(f"Processed {len(t_collator_calcs)} calculated field paths")
-
-# Build nodes (fields) and edges (dependencies) for the interactive lineage diagram
-import json
-
-nodes = []
-edges = []
-node_ids = set()
-
-# Add default fields as nodes (use original names for labels)
-for abbrev, original_name in mapping_dict_original_names.items():
-    if abbrev not in node_ids:
-        nodes.append({
-            'id': abbrev,
-            'label': original_name,
-            'group': 'default',
-            'title': f'Default Field: {original_name}'
-        })
-        node_ids.add(abbrev)
-
-# Add calculated fields as nodes (use original names for labels)
-for abbrev, original_name in calc_map_dict_original_names.items():
-    if abbrev not in node_ids:
-        calc_row = created_calc[created_calc['shorthand_abc'] == abbrev]
-        calc_formula = ''
-        if not calc_row.empty and calc_row['field_calculation'].values[0]:
-            calc_formula = str(calc_row['field_calculation'].values[0])
-        
-        nodes.append({
-            'id': abbrev,
-            'label': original_name,
-            'group': 'calculated',
-            'title': f'{original_name}\n\nFormula:\n{calc_formula}'
-        })
-        node_ids.add(abbrev)
-
-# Build edges from the collators
-for item in t_collator_def_fields:
-    parts = item['path_mermaid'].split(' --> ')
-    if len(parts) == 2:
-        edges.append({
-            'from': parts[0],
-            'to': parts[1],
-            'arrows': 'to'
-        })
-
-for item in t_collator_calcs:
-    parts = item['path_mermaid'].split(' --> ')
-    if len(parts) == 2:
-        edges.append({
-            'from': parts[0],
-            'to': parts[1],
-            'arrows': 'to'
-        })
-
-# Convert to JSON for JavaScript
-nodes_json = json.dumps(nodes)
-edges_json = json.dumps(edges)
-
-print(f"Total nodes: {len(nodes)}")
-print(f"Total edges: {len(edges)}")
-print("Nodes and edges prepared for lineage diagram")
-
-# Generate interactive HTML lineage diagram using Vis.js library (bundled locally)
-# Creates a hierarchical network visualization with tooltips showing formulas
-
-# Read the local Vis.js library file
-script_dir = os.path.dirname(os.path.abspath(__file__))
-visjs_path = os.path.join(script_dir, 'vis-network.min.js')
-with open(visjs_path, 'r', encoding='utf-8') as f:
-    visjs_content = f.read()
-
-html_base = """
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>""" + tableau_name_substring + """ Calculation Lineage</title>
-    <script type="text/javascript">
-""" + visjs_content + """
-    </script>
-    <style>
-        body {
-            font-family: Arial, sans-serif;
-            margin: 0;
-            padding: 20px;
-            background-color: #f5f5f5;
-        }
-        h1 {
-            color: #333;
-            text-align: center;
-        }
-        #mynetwork {
-            width: 100%;
-            height: 800px;
-            border: 1px solid #ddd;
-            background-color: white;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }
-        .controls {
-            text-align: center;
-            margin: 20px 0;
-            padding: 15px;
-            background-color: white;
-            border-radius: 5px;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }
-        .controls button {
-            margin: 0 5px;
-            padding: 10px 20px;
-            background-color: #4CAF50;
-            color: white;
-            border: none;
-            border-radius: 4px;
-            cursor: pointer;
-            font-size: 14px;
-        }
-        .controls button:hover {
-            background-color: #45a049;
-        }
-        .legend {
-            margin-top: 20px;
-            padding: 15px;
-            background-color: white;
-            border-radius: 5px;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }
-        .legend-item {
-            display: inline-block;
-            margin-right: 20px;
-        }
-        .legend-color {
-            display: inline-block;
-            width: 20px;
-            height: 20px;
-            border-radius: 50%;
-            margin-right: 5px;
-            vertical-align: middle;
-        }
-    </style>
-</head>
-<body>
-    <h1>""" + tableau_name_substring + """ Calculation Lineage</h1>
-    
-    <div class="controls">
-        <button onclick="network.fit()">Fit to Screen</button>
-        <button onclick="network.moveTo({scale: 1.0})">Reset Zoom</button>
-    </div>
-    
-    <div id="mynetwork"></div>
-    
-    <div class="legend">
-        <strong>Legend:</strong>
-        <div class="legend-item">
-            <span class="legend-color" style="background-color: #97C2FC;"></span>
-            <span>Default Fields</span>
-        </div>
-        <div class="legend-item">
-            <span class="legend-color" style="background-color: #FB7E81;"></span>
-            <span>Calculated Fields</span>
-        </div>
-    </div>
-
-    <script type="text/javascript">
-        // Create nodes and edges data
-        var nodes = new vis.DataSet(""" + nodes_json + """);
-        var edges = new vis.DataSet(""" + edges_json + """);
-
-        // Create network
-        var container = document.getElementById('mynetwork');
-        var data = {
-            nodes: nodes,
-            edges: edges
-        };
-        
-        var options = {
-            nodes: {
-                shape: 'box',
-                margin: 10,
-                widthConstraint: {
-                    maximum: 200
-                },
-                font: {
-                    size: 14
-                }
-            },
-            edges: {
-                arrows: {
-                    to: {
-                        enabled: true,
-                        scaleFactor: 0.5
-                    }
-                },
-                smooth: {
-                    type: 'cubicBezier',
-                    forceDirection: 'horizontal'
-                },
-                color: {
-                    color: '#848484',
-                    highlight: '#2B7CE9'
-                }
-            },
-            groups: {
-                default: {
-                    color: {
-                        background: '#97C2FC',
-                        border: '#2B7CE9',
-                        highlight: {
-                            background: '#D2E5FF',
-                            border: '#2B7CE9'
-                        }
-                    }
-                },
-                calculated: {
-                    color: {
-                        background: '#FB7E81',
-                        border: '#E92B36',
-                        highlight: {
-                            background: '#FFB5B8',
-                            border: '#E92B36'
-                        }
-                    }
-                }
-            },
-            layout: {
-                hierarchical: {
-                    enabled: true,
-                    direction: 'LR',
-                    sortMethod: 'directed',
-                    levelSeparation: 200,
-                    nodeSpacing: 150
-                }
-            },
-            physics: {
-                enabled: false
-            },
-            interaction: {
-                hover: true,
-                tooltipDelay: 100,
-                navigationButtons: true,
-                keyboard: true
-            }
-        };
-        
-        var network = new vis.Network(container, data, options);
-        
-        // Event listener for node clicks
-        network.on("click", function(params) {
-            if (params.nodes.length > 0) {
-                var nodeId = params.nodes[0];
-                var node = nodes.get(nodeId);
-                console.log("Clicked node:", node);
-            }
-        });
-        
-        // Fit network when loaded
-        network.once("stabilizationIterationsDone", function() {
-            network.fit();
-        });
-    </script>
-</body>
-</html>
-"""
-
-print('\n ______________________________ START_OF_HTML ______________________________')
-print(html_base[:500] + '...')
-print('\n ______________________________ END_OF_HTML ______________________________')
-
-# Output html string to a local file, then open it on the web browser
-
-# Specify the file path
-file_path = os.path.join('outputs', f'{tableau_name_substring}_lineage_diagram.html')
-
-# Write the string to an HTML file with UTF-8 encoding
-with open(file_path, 'w', encoding='utf-8') as file:
-    file.write(html_base)
-
-print("HTML content successfully written to {}".format(file_path))
-
-# Open the HTML file in the default web browser
-webbrowser.open('file://' + os.path.realpath(file_path))
-
-print("\n✓ Interactive lineage diagram created and opened in browser (OFFLINE MODE)")
-print("✓ Vis.js library bundled locally - no internet required")
-
+        print("✓ Vis.js library bundled locally - no internet required")
+
+
+def print_profile(report):
+    # Per-stage table of a --profile report
+    print(f"\n{'stage':<10}{'seconds':>10}{'RSS MB':>10}{'peak RSS MB':>13}" + (f"{'traced peak MB':>16}" if report['mode'] == 'memory' else ''))
+    for stage in report['stages']:
+        rss, peak = (f"{v / 1e6:.1f}" if v is not None else '-' for v in (stage['rss_bytes'], stage['peak_rss_bytes']))
+        line = f"{stage['stage']:<10}{stage['seconds']:>10.3f}{rss:>10}{peak:>13}"
+        if 'traced_peak_bytes' in stage:
+            line += f"{stage['traced_peak_bytes'] / 1e6:>16.1f}"
+        print(line)
+
+
+def print_lineage_result(result):
+    # Human readable output of the lineage subcommand for one workbook
+    print(f"\n{result['workbook']}")
+    if result['status'] != 'ok':
+        print(f"  error: {result['error']}")
+        return
+    print(f"  {result['nodes']} nodes, {result['edges']} edges, max depth {result['max_depth']}")
+    for cycle in result['cycles']:
+        print(f"  cycle: {' -> '.join(cycle)}")
+    for field in result['fields']:
+        if not field['found']:
+            print(f"  {field['query']}: not in the lineage graph")
+            continue
+        print(f"  {field['name']} {field['field_id']} ({field['field_type']}, {field['datasource']}), depth {field['depth']}")
+        for direction in ('upstream', 'downstream'):
+            print(f"    {direction}: {len(field[direction])}")
+            for other in field[direction]:
+                print(f"      {'  ' * (other['distance'] - 1)}{other['name']} {other['field_id']}")
+        if field['affected_worksheets']:
+            print(f"    affected worksheets: {', '.join(field['affected_worksheets'])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract Tableau calculations and build lineage diagrams.")
+    parser.add_argument('--streaming', action='store_true', help="Read workbooks with the single-pass streaming parser instead of the Document API")
+    parser.add_argument('--shared-assets', action='store_true', help="Write vis-network.min.js once to the output folder and reference it from each diagram instead of inlining it")
+    parser.add_argument('--export', action='append', default=[], choices=gx.EXPORT_FORMATS, metavar='FORMAT',
+                        help="Also write the lineage graph as data files: jsonl, graphml or parquet (repeat for several)")
+    parser.add_argument('--cache-dir', default=None, help="Reuse extraction results of unchanged workbooks from this cache directory")
+    parser.add_argument('--cache-max-mb', type=int, default=xc.DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="Size limit of the cache directory; least recently used entries are evicted (default: 512)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="With --cache-dir: only recompute calculations that changed since the last run of the same workbook")
+    parser.add_argument('--profile', default=None, choices=sp.PROFILE_MODES, metavar='MODE',
+                        help="Write a per-stage profile report next to the outputs: time (timers and RSS), "
+                             "memory (adds tracemalloc) or cprofile (adds cProfile data)")
+    subparsers = parser.add_subparsers(dest='command')
+
+    batch_parser = subparsers.add_parser('batch', help="Process every .twb/.twbx under a directory tree in parallel")
+    batch_parser.add_argument('input_dir', nargs='?', default=input_path, help="Directory to search recursively (default: inputs)")
+    batch_parser.add_argument('-o', '--output-dir', default=output_path, help="Directory for outputs and batch_summary.json (default: outputs)")
+    batch_parser.add_argument('-w', '--workers', type=int, default=None, help="Number of worker processes (default: CPU count)")
+
+    lineage_parser = subparsers.add_parser('lineage', help="Query transitive upstream/downstream lineage of fields across workbooks")
+    lineage_parser.add_argument('paths', nargs='+', help="Workbooks and/or directories to search recursively")
+    lineage_parser.add_argument('-f', '--field', action='append', default=[], help="Field name, [field ID] or diagram ID to trace (repeat for several)")
+    lineage_parser.add_argument('-w', '--workers', type=int, default=1, help="Number of worker processes (default: 1)")
+    lineage_parser.add_argument('--json', action='store_true', help="Print one JSON object per workbook (JSON Lines)")
+
+    index_parser = subparsers.add_parser('index', help="Add or refresh workbooks in a cross-workbook SQLite lineage index")
+    index_parser.add_argument('database', help="SQLite database file (created if missing)")
+    index_parser.add_argument('paths', nargs='+', help="Workbooks and/or directories to search recursively")
+    index_parser.add_argument('-w', '--workers', type=int, default=None, help="Number of worker processes (default: CPU count)")
+    index_parser.add_argument('--prune', action='store_true', help="Remove indexed workbooks that no longer exist on disk")
+
+    find_parser = subparsers.add_parser('find', help="Find the workbooks in a lineage index that contain a field")
+    find_parser.add_argument('database', help="SQLite database built with the index subcommand")
+    find_parser.add_argument('field', help="Field name or [field ID]")
+    find_parser.add_argument('-d', '--datasource', default=None, help="Only match fields of this datasource (name or caption)")
+    find_parser.add_argument('--json', action='store_true', help="Print one JSON object per match (JSON Lines)")
+
+    args = parser.parse_args(argv)
+    if args.incremental and not args.cache_dir:
+        parser.error("--incremental needs --cache-dir")
+    cache = xc.ExtractionCache(args.cache_dir, args.cache_max_mb * 1024 * 1024) if args.cache_dir else None
+
+    if args.command == 'batch':
+        summary = eng.run_batch(args.input_dir, args.output_dir, args.workers, streaming=args.streaming,
+                                shared_assets=args.shared_assets, exports=args.export, cache=cache,
+                                incremental=args.incremental, profile=args.profile)
+        return 1 if summary['failed'] else 0
+
+    if args.command == 'index':
+        summary = lix.index_workbooks(args.database, args.paths, args.workers, streaming=args.streaming, cache=cache,
+                                      prune=args.prune)
+        print(f"Indexed {summary['indexed']}, unchanged {summary['unchanged']}, failed {summary['failed']}, "
+              f"removed {summary['removed']} in {summary['seconds']}s")
+        for error in summary['errors']:
+            print(f"  error: {error['workbook']}: {error['error']}")
+        return 1 if summary['failed'] else 0
+
+    if args.command == 'find':
+        matches = lix.find_field_usage(args.database, args.field, args.datasource)
+        for match in matches:
+            if args.json:
+                print(json.dumps(match))
+                continue
+            used = f"used in {', '.join(match['worksheets'])}" if match['worksheets'] else "not used in any worksheet"
+            print(f"{match['workbook']}: {match['name']} {match['field_id']} ({match['datasource_caption']}), {used}")
+            for calc in match['referenced_by']:
+                print(f"    referenced by {calc['name']} {calc['field_id']}")
+        if not args.json:
+            print(f"{len(matches)} match(es)")
+        return 0
+
+    if args.command == 'lineage':
+        failed = 0
+        for result in eng.query_lineage(args.paths, args.field, args.workers, streaming=args.streaming, cache=cache):
+            failed += result['status'] != 'ok'
+            if args.json:
+                print(json.dumps(result))
+            else:
+                print_lineage_result(result)
+        return 1 if failed else 0
+
+    run_single(streaming=args.streaming, shared_assets=args.shared_assets, exports=args.export, cache=cache,
+               incremental=args.incremental, profile=args.profile)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
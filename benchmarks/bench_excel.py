@@ -0,0 +1,82 @@
+"""
+bench_excel.py
+
+Benchmark for the Calculations_table export: the original pandas path
+(DataFrame.to_excel through Excelcreator.create_excel_from_dfs, kept as
+Extractorengine.render_excel_dataframe) against the constant_memory xlsxwriter path that
+render_excel uses. Both write the same synthetic report table; time and peak Python memory
+(tracemalloc, in a second run) are reported, and a smaller table is read back to check both
+files hold the same cells.
+
+    python benchmarks/bench_excel.py            # 100k rows
+    python benchmarks/bench_excel.py 500000
+"""
+
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Extractorengine as eng
+
+
+def synthetic_report(n_rows, seed=0):
+    """Frame with the columns and value mix of extract_calculations()'s df1."""
+    rng = np.random.default_rng(seed)
+    kind = rng.integers(0, 3, n_rows)
+    used = rng.integers(0, 2, n_rows).astype(bool)
+    return pd.DataFrame({
+        'Field_Name': [f'Sales {i}' for i in range(n_rows)],
+        'DataType': np.where(kind == 0, 'real', 'string'),
+        'Type': np.array(['Default_Field', 'Parameters', 'Calculated_Field'])[kind],
+        'Calculation': [None if k == 0 else f'SUM([Sales {i}]) / [Target Rate] // margin {i}' for i, k in enumerate(kind)],
+        'Field_ID': [f'[Calculation_{i}]' for i in range(n_rows)],
+        'Datasource': 'Orders (Superstore)',
+        'Worksheets': np.where(used, 'Sheet 1, Overview', ''),
+        'Used_In_Report': np.where(used, 'Yes', 'No'),
+    })
+
+
+def _measure(func, *args):
+    # Timed and memory-traced in separate runs, since tracemalloc slows allocation-heavy code down
+    start = time.perf_counter()
+    func(*args)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def check_same_cells(n_rows=2000):
+    df1 = synthetic_report(n_rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        old_path, new_path = os.path.join(tmp, 'old.xlsx'), os.path.join(tmp, 'new.xlsx')
+        eng.render_excel_dataframe(df1, old_path)
+        eng.render_excel(df1, new_path)
+        if not pd.read_excel(old_path).equals(pd.read_excel(new_path)):
+            raise AssertionError("constant_memory writer output differs from the pandas path")
+
+
+def run(n_rows=100000):
+    check_same_cells()
+    df1 = synthetic_report(n_rows)
+    print(f"{n_rows:,} rows")
+    print(f"{'path':<26}{'seconds':>10}{'peak MB':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        results = []
+        for name, func in (('pandas to_excel', eng.render_excel_dataframe), ('constant_memory records', eng.render_excel)):
+            seconds, peak = _measure(func, df1, os.path.join(tmp, name.replace(' ', '_') + '.xlsx'))
+            results.append(seconds)
+            print(f"{name:<26}{seconds:>10.2f}{peak / 1e6:>10.1f}")
+    print(f"speedup: {results[0] / results[1]:.1f}x")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,118 @@
+"""
+bench_incremental.py
+
+Re-run time of process_workbook after a small edit, with and without --incremental, on a
+synthetic workbook (benchmarks/synthetic_workbook.py). For each edit:
+- plain:         a full run of the edited workbook (no cache)
+- incremental:   an incremental run of the edited workbook after an incremental run of the original
+
+Edits: renaming the caption of one calculation that other calculations reference, and
+changing the formula of one calculation. The outputs of the incremental run are compared with
+those of the plain run byte for byte (every member of the Excel package but its creation time,
+and the HTML file). The Calcparser formula memo is cleared before every timed run, so each run
+starts as a new process would.
+
+    python benchmarks/bench_incremental.py              # 50k fields
+    python benchmarks/bench_incremental.py 10000 --repeat 3
+"""
+
+import os
+import re
+import sys
+import time
+import shutil
+import zipfile
+import filecmp
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Extractorengine as eng
+import Extractioncache as xc
+import Calcparser as cp
+import synthetic_workbook as swb
+
+
+def _referenced_calculation(xml):
+    # A calculation that another calculation's formula references, and its caption
+    calc_id = re.search(r'formula="[^"]*(\[Calculation_\d+\])', xml).group(1)
+    caption = re.search(r'<column caption="([^"]*)"[^>]*name="' + re.escape(calc_id) + '"', xml).group(1)
+    return calc_id, caption
+
+
+def edits(xml):
+    """(name, edited XML) for each benchmarked edit."""
+
+    calc_id, caption = _referenced_calculation(xml)
+    renamed = xml.replace(f'caption="{caption}"', f'caption="{caption} renamed"', 1)
+    formula = re.search(r'name="' + re.escape(calc_id) + r'"[^>]*><calculation class=\'tableau\' (formula=(["\'])(.*?)\2)', xml)
+    attribute, quote, text = formula.groups()
+    reformulated = xml.replace(attribute, f'formula={quote}{text} + 1{quote}', 1)
+    return [('rename caption', renamed), ('edit formula', reformulated)]
+
+
+def _timed(func, *args, **kwargs):
+    cp.clear_cache()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def _package_members(excel_path):
+    # Every member of an .xlsx package except docProps/core.xml, which holds the creation time
+    with zipfile.ZipFile(excel_path) as package:
+        return {name: package.read(name) for name in package.namelist() if name != 'docProps/core.xml'}
+
+
+def same_outputs(summary, other):
+    """True when two process_workbook runs wrote the same Excel package (every sheet) and the same HTML file."""
+
+    return _package_members(summary['excel_path']) == _package_members(other['excel_path']) \
+        and filecmp.cmp(summary['html_path'], other['html_path'], shallow=False)
+
+
+def run(n_fields=50000, repeat=1):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        original_path = os.path.join(tmp, 'original.twb')
+        swb.generate_workbook(original_path, fields=n_fields)
+        with open(original_path, encoding='utf-8') as f:
+            original = f.read()
+
+        for name, edited in edits(original):
+            best = {}
+            for _ in range(repeat):
+                workbook_path = os.path.join(tmp, 'workbook.twb')
+                cache_dir = os.path.join(tmp, 'cache')
+                shutil.rmtree(cache_dir, ignore_errors=True)
+                cache = xc.ExtractionCache(cache_dir)
+
+                shutil.copyfile(original_path, workbook_path)
+                eng.process_workbook(workbook_path, os.path.join(tmp, 'incremental'), cache=cache, incremental=True)
+                with open(workbook_path, 'w', encoding='utf-8') as f:
+                    f.write(edited)
+                incremental_seconds, incremental = _timed(eng.process_workbook, workbook_path,
+                                                          os.path.join(tmp, 'incremental'), cache=cache, incremental=True)
+                plain_seconds, plain = _timed(eng.process_workbook, workbook_path, os.path.join(tmp, 'plain'))
+
+                best['plain'] = min(best.get('plain', plain_seconds), plain_seconds)
+                best['incremental'] = min(best.get('incremental', incremental_seconds), incremental_seconds)
+            best['changed_calculations'] = incremental['changed_calculations']
+            best['patched_outputs'] = incremental['patched_outputs']
+            best['same_outputs'] = same_outputs(incremental, plain)
+            results[name] = best
+
+    print(f"{n_fields:,} fields")
+    for name, result in results.items():
+        print(f"  {name:<16} plain {result['plain']:>7.2f}s   incremental {result['incremental']:>7.2f}s   "
+              f"({result['changed_calculations']} calculations changed, patched: {', '.join(result['patched_outputs']) or '-'}, "
+              f"outputs {'identical' if result['same_outputs'] else 'DIFFERENT'})")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-run time after a small edit, plain versus --incremental.")
+    parser.add_argument('fields', nargs='?', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per edit; the fastest is kept")
+    args = parser.parse_args()
+    run(args.fields, args.repeat)
@@ -0,0 +1,87 @@
+"""
+bench_memory.py
+
+Memory of the load and extract stages on a synthetic workbook (benchmarks/synthetic_workbook.py):
+- peak:           highest Python allocation (tracemalloc) while loading and extracting
+- steady state:   what the field tables still hold once the loaded workbook has been released,
+                  i.e. what a batch worker carries into the lineage, Excel and HTML stages
+- frame:          deep memory_usage of df_API_all and df1
+- RSS:            process RSS growth at peak and in the steady state; tracemalloc does not see the
+                  libxml2 tree behind a Document API workbook, RSS does (freed heap is handed back
+                  with malloc_trim where glibc provides it, so the steady-state figure is meaningful)
+
+    python benchmarks/bench_memory.py                 # 100k fields
+    python benchmarks/bench_memory.py 10000 --streaming
+"""
+
+import gc
+import os
+import sys
+import ctypes
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Extractorengine as eng
+import Stageprofiler as sp
+import synthetic_workbook as swb
+
+
+def _trimmed_rss():
+    gc.collect()
+    try:
+        ctypes.CDLL(None).malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+    return sp.current_rss()
+
+
+def measure(workbook_path, streaming=False):
+    """Peak and steady-state traced bytes and RSS of load + extract, and the deep size of the two frames."""
+
+    rss_baseline = _trimmed_rss()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+
+    workbook = eng.load_workbook(workbook_path, streaming=streaming)
+    loaded = tracemalloc.get_traced_memory()[0] - baseline
+    df1, df_API_all = eng.extract_calculations(workbook)
+    rss_peak = sp.current_rss()
+    del workbook
+    gc.collect()
+
+    steady, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_steady = _trimmed_rss()
+    return {
+        'rss_peak_bytes': rss_peak - rss_baseline if rss_baseline is not None else None,
+        'rss_steady_bytes': rss_steady - rss_baseline if rss_baseline is not None else None,
+        'loaded_bytes': loaded,
+        'peak_bytes': peak - baseline,
+        'steady_bytes': steady - baseline,
+        'frame_bytes': int(df_API_all.memory_usage(deep=True).sum() + df1.memory_usage(deep=True).sum()),
+    }
+
+
+def run(n_fields=100000, streaming=False):
+    with tempfile.TemporaryDirectory() as tmp:
+        workbook_path = os.path.join(tmp, 'synthetic.twb')
+        swb.generate_workbook(workbook_path, fields=n_fields)
+        result = measure(workbook_path, streaming)
+    print(f"{n_fields:,} fields ({'streaming' if streaming else 'Document API'})")
+    for key, label in (('loaded_bytes', 'loaded workbook'), ('peak_bytes', 'peak'),
+                       ('steady_bytes', 'steady state'), ('frame_bytes', 'frames (deep)')):
+        print(f"  {label:<18}{result[key] / 1e6:>10.1f} MB")
+    if result['rss_steady_bytes'] is not None:
+        print(f"  {'RSS after extract':<18}{result['rss_peak_bytes'] / 1e6:>10.1f} MB")
+        print(f"  {'RSS steady state':<18}{result['rss_steady_bytes'] / 1e6:>10.1f} MB")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Peak and steady-state memory of loading and extracting a workbook.")
+    parser.add_argument('fields', nargs='?', type=int, default=100000)
+    parser.add_argument('--streaming', action='store_true')
+    args = parser.parse_args()
+    run(args.fields, args.streaming)
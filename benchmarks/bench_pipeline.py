@@ -0,0 +1,167 @@
+"""
+bench_pipeline.py
+
+End-to-end benchmark of the extraction pipeline on synthetic workbooks
+(benchmarks/synthetic_workbook.py) of increasing size, so a change to any stage can be
+measured against a baseline run without sharing real workbooks.
+
+For each size the stages are timed separately, in pipeline order:
+- workbook_load:              Document API load (load_workbook)
+- workbook_load_streaming:    single-pass iterparse load (load_workbook(streaming=True))
+- build_collator:             one FieldRecord per field of every datasource
+- friendly_names:             default_to_friendly_names2 over the collator
+- extract_calculations:       the whole extract stage (includes the two above) building df1
+- resolve_lineage:            lineage nodes and edges, with create_lineage_paths timed inside it
+- excel:                      render_excel
+- html:                       render_html
+
+Every stage is run --repeat times and the fastest run is kept. The Calcparser formula memo is
+cleared before every run, so later runs lex every formula again like the first one. Results are
+printed as a table and written as JSON (extractor version, Python/pandas versions, workbook shape
+and seconds per stage), so runs on different commits can be compared.
+
+    python benchmarks/bench_pipeline.py                             # 1k, 10k and 100k fields
+    python benchmarks/bench_pipeline.py --sizes 1000 10000 -o before.json
+    python benchmarks/bench_pipeline.py --chain-depth 20 --fan-in 4
+"""
+
+import os
+import sys
+import time
+import json
+import platform
+import argparse
+import tempfile
+import contextlib
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Extractorengine as eng
+import Calcparser as cp
+import synthetic_workbook as swb
+
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+STAGES = ('workbook_load', 'workbook_load_streaming', 'build_collator', 'friendly_names',
+          'extract_calculations', 'resolve_lineage', 'create_lineage_paths', 'excel', 'html')
+
+
+@contextlib.contextmanager
+def _timed_function(module, name, totals):
+    # Accumulate the time spent in module.name while the block runs (for a stage nested in another)
+    original = getattr(module, name)
+
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            totals[name] = totals.get(name, 0.0) + time.perf_counter() - start
+
+    setattr(module, name, timed)
+    try:
+        yield
+    finally:
+        setattr(module, name, original)
+
+
+def _best_of(repeat, func, *args):
+    # Fastest of repeat runs; returns (seconds, result of the last run). Every run starts with an
+    # empty formula memo, otherwise all runs after the first would skip lexing
+    best = None
+    for _ in range(repeat):
+        cp.clear_cache()
+        start = time.perf_counter()
+        result = func(*args)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+
+def bench_workbook(workbook_path, output_dir, repeat=1):
+    """Seconds per stage for one workbook, plus the size of the extracted tables and graph."""
+
+    cp.clear_cache()
+    stages = {}
+    stages['workbook_load'], workbook = _best_of(repeat, eng.load_workbook, workbook_path)
+    stages['workbook_load_streaming'], _ = _best_of(repeat, eng.load_workbook, workbook_path, True)
+    stages['build_collator'], (collator, calcDict) = _best_of(repeat, eng.build_collator, workbook)
+    # default_to_friendly_names2 rewrites the collator in place, so each run gets a fresh one
+    stages['friendly_names'] = min(
+        _best_of(1, eng.default_to_friendly_names2, eng.build_collator(workbook)[0], 'field_calculation', calcDict)[0]
+        for _ in range(repeat))
+    stages['extract_calculations'], (df1, df_API_all) = _best_of(repeat, eng.extract_calculations, workbook)
+
+    lineage_runs = []
+    for _ in range(repeat):
+        nested = {}
+        with _timed_function(eng, 'create_lineage_paths', nested):
+            seconds, (nodes, edges, _, _) = _best_of(1, eng.resolve_lineage, df1, df_API_all)
+        lineage_runs.append((seconds, nested.get('create_lineage_paths', 0.0)))
+    stages['resolve_lineage'], stages['create_lineage_paths'] = min(lineage_runs)
+
+    stages['excel'], _ = _best_of(repeat, eng.render_excel, df1, os.path.join(output_dir, 'bench.xlsx'))
+    stages['html'], _ = _best_of(repeat, eng.render_html, nodes, edges, 'bench', os.path.join(output_dir, 'bench.html'))
+
+    return {
+        'fields': len(df_API_all),
+        'report_rows': len(df1),
+        'calculated_fields': int((df1['Type'] == 'Calculated_Field').sum()),
+        'nodes': len(nodes),
+        'edges': len(edges),
+        'stages': {stage: round(stages[stage], 4) for stage in STAGES},
+    }
+
+
+def run(sizes=DEFAULT_SIZES, repeat=1, packaged=False, output=None, **shape):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            workbook_path = os.path.join(tmp, f'synthetic_{size}.twbx' if packaged else f'synthetic_{size}.twb')
+            spec = swb.generate_workbook(workbook_path, fields=size, **shape)
+            result = {'size': size, 'workbook_bytes': os.path.getsize(workbook_path), 'spec': spec}
+            result.update(bench_workbook(workbook_path, tmp, repeat))
+            results.append(result)
+            _print_result(result)
+
+    report = {
+        'extractor_version': eng.EXTRACTOR_VERSION,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'packaged': packaged,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {output}")
+    return report
+
+
+def _print_result(result):
+    print(f"\n{result['size']:,} fields ({result['workbook_bytes'] / 1e6:.1f} MB, "
+          f"{result['nodes']:,} nodes, {result['edges']:,} edges)")
+    for stage, seconds in result['stages'].items():
+        print(f"  {stage:<26}{seconds:>10.3f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time each pipeline stage on synthetic workbooks.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help="Field counts to benchmark")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per stage; the fastest is kept")
+    parser.add_argument('--packaged', action='store_true', help="Benchmark .twbx packages instead of .twb files")
+    parser.add_argument('-o', '--output', default='bench_pipeline.json', help="JSON results file")
+    for name, default in swb.DEFAULT_SPEC.items():
+        if name != 'fields':
+            parser.add_argument('--' + name.replace('_', '-'), type=type(default), default=default)
+    args = vars(parser.parse_args(argv))
+    run(args.pop('sizes'), args.pop('repeat'), args.pop('packaged'), args.pop('output'), **args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+synthetic_workbook.py
+
+Generator of synthetic Tableau workbooks for benchmarking, since real workbooks can't be shared.
+
+The files are valid .twb XML (or .twbx packages holding one) that both the Document API and
+Streamextractor read, with a configurable shape:
+- datasources:   number of datasources the fields are spread over, plus a Parameters datasource
+- fields:        total number of fields (columns + calculations + parameters)
+- calc_ratio:    share of the fields that are calculations
+- fan_in:        references in each calculation formula
+- fan_out:       average number of calculations referencing the same field
+- chain_depth:   levels of calculations; level 1 references columns, level k references level k-1
+- worksheets:    number of worksheets; used_fraction of the fields is spread across them
+
+Formulas mix the syntax the extractor has to cope with: comments, string literals with
+brackets, aggregations and parameter references.
+
+    python benchmarks/synthetic_workbook.py out.twb --fields 10000 --chain-depth 8
+    python benchmarks/synthetic_workbook.py out.twbx --fields 1000
+"""
+
+import os
+import sys
+import math
+import random
+import zipfile
+import argparse
+from xml.sax.saxutils import quoteattr
+
+
+DEFAULT_SPEC = {
+    'datasources': 2,
+    'fields': 1000,
+    'calc_ratio': 0.4,
+    'parameters': 5,
+    'fan_in': 2,
+    'fan_out': 3,
+    'chain_depth': 5,
+    'worksheets': 10,
+    'used_fraction': 0.5,
+    'seed': 0,
+}
+
+
+def _split(total, parts):
+    # Spread total over parts as evenly as possible
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+
+def build_model(spec):
+    """Datasources with their columns and calculations, and the worksheet usage, as plain data."""
+
+    rng = random.Random(spec['seed'])
+    n_parameters = min(spec['parameters'], spec['fields'])
+    n_calcs = int((spec['fields'] - n_parameters) * spec['calc_ratio'])
+    n_columns = spec['fields'] - n_parameters - n_calcs
+
+    parameters = [{'id': f'[Parameter {i + 1}]', 'caption': f'Rate {i + 1}', 'formula': f'{(i + 1) / 10}'}
+                  for i in range(n_parameters)]
+
+    datasources = []
+    calc_counter = 0
+    for ds_index, (ds_columns, ds_calcs) in enumerate(zip(_split(n_columns, spec['datasources']),
+                                                          _split(n_calcs, spec['datasources']))):
+        columns = [{'id': f'[Column {ds_index}_{i}]', 'caption': None} for i in range(ds_columns)]
+
+        calcs = []
+        previous_level = columns
+        for level_size in _split(ds_calcs, max(1, spec['chain_depth'])):
+            if level_size == 0:
+                continue
+            # Pick level_size * fan_in / fan_out distinct inputs, so each is referenced ~fan_out times
+            n_targets = max(1, min(len(previous_level), math.ceil(level_size * spec['fan_in'] / spec['fan_out'])))
+            targets = rng.sample(previous_level, n_targets) if previous_level else []
+            level = []
+            for i in range(level_size):
+                calc_counter += 1
+                refs = [targets[(i * spec['fan_in'] + k) % len(targets)]['id'] for k in range(spec['fan_in'])] if targets else []
+                level.append({'id': f'[Calculation_{calc_counter}]', 'caption': f'Calc {calc_counter} (net %)',
+                              'formula': _formula(calc_counter, refs, parameters)})
+            calcs.extend(level)
+            previous_level = level
+        datasources.append({'name': f'federated.synthetic{ds_index}', 'caption': f'Synthetic Source {ds_index}',
+                            'columns': columns, 'calcs': calcs})
+
+    # Worksheet usage: used_fraction of all fields, round-robin over the worksheets
+    all_fields = [(ds['name'], f['id']) for ds in datasources for f in ds['columns'] + ds['calcs']]
+    all_fields += [('Parameters', p['id']) for p in parameters]
+    used = rng.sample(all_fields, int(len(all_fields) * spec['used_fraction']))
+    worksheets = [{'name': f'Sheet {i + 1}', 'fields': []} for i in range(max(1, spec['worksheets']))]
+    for i, field in enumerate(used):
+        worksheets[i % len(worksheets)]['fields'].append(field)
+
+    return {'datasources': datasources, 'parameters': parameters, 'worksheets': worksheets}
+
+
+def _formula(number, refs, parameters):
+    parts = ' + '.join(f'SUM({ref})' if i % 2 else ref for i, ref in enumerate(refs)) or '0'
+    formula = f'({parts})'
+    if parameters and number % 3 == 0:
+        formula += f' * [Parameters].{parameters[number % len(parameters)]["id"]}'
+    if number % 5 == 0:
+        formula = f'// margin step {number}\r\n{formula}'
+    if number % 7 == 0:
+        formula = f'IF {formula} > 0 THEN "[ok]" ELSE "[check]" END'
+    return formula
+
+
+def _column_xml(field, datatype='real', role='measure', kind='quantitative'):
+    caption = f' caption={quoteattr(field["caption"])}' if field.get('caption') else ''
+    head = f"<column{caption} datatype='{datatype}' name={quoteattr(field['id'])} role='{role}' type='{kind}'"
+    if 'formula' in field:
+        return f"{head}><calculation class='tableau' formula={quoteattr(field['formula'])} /></column>\n"
+    return head + ' />\n'
+
+
+def write_twb(model, out):
+    """Write the workbook XML of a model to a text file object."""
+
+    out.write("<?xml version='1.0' encoding='utf-8' ?>\n")
+    out.write("<workbook source-build='2023.1.0' source-platform='win' version='18.1' "
+              "xmlns:user='http://www.tableausoftware.com/xml/user'>\n<datasources>\n")
+
+    if model['parameters']:
+        out.write("<datasource hasconnection='false' inline='true' name='Parameters' version='18.1'>\n")
+        for parameter in model['parameters']:
+            out.write(_column_xml(parameter))
+        out.write("</datasource>\n")
+
+    for ds in model['datasources']:
+        out.write(f"<datasource caption={quoteattr(ds['caption'])} inline='true' name={quoteattr(ds['name'])} version='18.1'>\n")
+        out.write("<connection class='federated'><named-connections /></connection>\n")
+        for column in ds['columns']:
+            out.write(_column_xml(column))
+        for calc in ds['calcs']:
+            out.write(_column_xml(calc))
+        out.write("</datasource>\n")
+    out.write("</datasources>\n<worksheets>\n")
+
+    for worksheet in model['worksheets']:
+        out.write(f"<worksheet name={quoteattr(worksheet['name'])}><table><view>\n<datasources />\n")
+        by_datasource = {}
+        for ds_name, field_id in worksheet['fields']:
+            by_datasource.setdefault(ds_name, []).append(field_id)
+        for ds_name, field_ids in by_datasource.items():
+            out.write(f"<datasource-dependencies datasource={quoteattr(ds_name)}>\n")
+            for field_id in field_ids:
+                out.write(f"<column name={quoteattr(field_id)} />\n")
+            out.write("</datasource-dependencies>\n")
+        out.write("</view></table></worksheet>\n")
+    out.write("</worksheets>\n</workbook>\n")
+
+
+def generate_workbook(path, **spec):
+    """Write a synthetic workbook to path (.twb, or .twbx for a package) and return the spec used."""
+
+    unknown = set(spec) - set(DEFAULT_SPEC)
+    if unknown:
+        raise TypeError(f"Unknown workbook settings: {', '.join(sorted(unknown))}")
+    spec = dict(DEFAULT_SPEC, **spec)
+    model = build_model(spec)
+
+    if path.lower().endswith('.twbx'):
+        twb_name = os.path.splitext(os.path.basename(path))[0] + '.twb'
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+            with z.open(twb_name, 'w') as raw:
+                with _TextWriter(raw) as out:
+                    write_twb(model, out)
+    else:
+        with open(path, 'w', encoding='utf-8') as out:
+            write_twb(model, out)
+    return spec
+
+
+class _TextWriter(object):
+    # Minimal text wrapper for a binary zip member stream (io.TextIOWrapper would close the member itself)
+    def __init__(self, raw):
+        self.raw = raw
+
+    def write(self, text):
+        self.raw.write(text.encode('utf-8'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic Tableau workbook for benchmarking.")
+    parser.add_argument('path', help="Output .twb or .twbx file")
+    for name, default in DEFAULT_SPEC.items():
+        parser.add_argument('--' + name.replace('_', '-'), type=type(default), default=default)
+    args = vars(parser.parse_args(argv))
+    path = args.pop('path')
+    spec = generate_workbook(path, **args)
+    print(f"Wrote {path} ({os.path.getsize(path):,} bytes): {spec}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+calcparser_test.py
+
+Tests for the calculation lexer (Calcparser.py), which decides which field references are
+extracted from every formula and therefore which lineage edges exist.
+
+    python -m unittest discover -p "*test.py"
+"""
+
+import unittest
+
+import Calcparser as cp
+
+
+def references(formula):
+    return list(cp.parse_formula(formula).references)
+
+
+class ReferencesTest(unittest.TestCase):
+
+    def test_bracketed_fields_in_order_of_first_appearance(self):
+        self.assertEqual(references('[Sales] - [Cost] + [Sales]'), ['[Sales]', '[Cost]'])
+
+    def test_line_comment(self):
+        self.assertEqual(references('[Sales] // was [Profit] * 2\n+ [Cost]'), ['[Sales]', '[Cost]'])
+        self.assertEqual(references('// [Profit] only in a comment'), [])
+
+    def test_block_comment(self):
+        self.assertEqual(references('[Sales] /* [Profit]\n[Margin] */ * 2'), ['[Sales]'])
+
+    def test_string_literals_with_brackets(self):
+        self.assertEqual(references('IF [Sales] > 0 THEN "[ok]" ELSE \'[check]\' END'), ['[Sales]'])
+        # Doubled quotes escape a quote inside the literal
+        self.assertEqual(references('"say ""[x]""" + [Name]'), ['[Name]'])
+
+    def test_qualified_field(self):
+        self.assertEqual(references('[Sales] * [Parameters].[Parameter 1]'), ['[Sales]', '[Parameter 1]'])
+        self.assertEqual(references('[federated.abc].[Sales]'), ['[Sales]'])
+
+    def test_lod_keywords(self):
+        self.assertEqual(references('{FIXED [Region] : SUM([Sales])}'), ['[Region]', '[Sales]'])
+        self.assertEqual(references('{ include [Customer] : AVG([Profit]) }'), ['[Customer]', '[Profit]'])
+        self.assertEqual(references('{EXCLUDE [Month] : MAX([Sales])} / [Sales]'), ['[Month]', '[Sales]'])
+
+    def test_lod_keyword_outside_braces_is_a_field(self):
+        self.assertEqual(references('Fixed + 1'), ['[Fixed]'])
+
+    def test_bare_names_and_functions(self):
+        self.assertEqual(references('SUM(Sales) * Rate'), ['[Sales]', '[Rate]'])
+        self.assertEqual(references('ZN (Profit)'), ['[Profit]'])
+        self.assertEqual(references('IF Sales > 0 AND NOT Returned THEN TRUE ELSE NULL END'), ['[Sales]', '[Returned]'])
+
+    def test_non_ascii_bare_names(self):
+        self.assertEqual(references('Umsätze + 1'), ['[Umsätze]'])
+        self.assertEqual(references('SUM(Größe) / Menge'), ['[Größe]', '[Menge]'])
+
+    def test_escaped_closing_bracket(self):
+        self.assertEqual(references('[Sales [EUR]]] + [Cost]'), ['[Sales [EUR]]]', '[Cost]'])
+
+    def test_numbers_dates_and_broken_formulas(self):
+        self.assertEqual(references('1.5e3 + .5 + #2024-01-31# + [Sales]'), ['[Sales]'])
+        # Unknown characters are skipped and the references around them are still reported
+        self.assertEqual(references('[Sales] @ ~ [Cost]'), ['[Sales]', '[Cost]'])
+        self.assertEqual(references('[Sales'), ['[Sales]'])
+
+    def test_formula_references_of_missing_formula(self):
+        self.assertEqual(cp.formula_references(None), [])
+        self.assertEqual(cp.formula_references(float('nan')), [])
+
+
+class RewriteTest(unittest.TestCase):
+
+    def test_no_replacement_round_trips(self):
+        for formula in ('[Sales] // [Profit]\n* "[x]"', '{FIXED [Region] : SUM(Sales)}', '', '[A]]]'):
+            self.assertEqual(cp.parse_formula(formula).rewrite({}), formula)
+
+    def test_replaces_only_field_names(self):
+        parsed = cp.parse_formula('[Calculation_1] + Calculation_1 // [Calculation_1]\n+ "[Calculation_1]"')
+        self.assertEqual(parsed.rewrite({'[Calculation_1]': '[Gap]'}), '[Gap] + [Gap] // [Calculation_1]\n+ "[Calculation_1]"')
+
+    def test_replaces_qualifiers(self):
+        parsed = cp.parse_formula('[Parameters].[Parameter 1] * [Sales]')
+        self.assertEqual(parsed.rewrite({'[Parameters]': '[P]', '[Parameter 1]': '[Rate]'}), '[P].[Rate] * [Sales]')
+
+    def test_replacement_round_trips(self):
+        formula = '{FIXED [Region] : SUM([Sales [EUR]]])} /* [Sales [EUR]]] */ - Umsätze'
+        forward = {'[Region]': '[Calculation_7]', '[Sales [EUR]]]': '[Calculation_8]', '[Umsätze]': '[Calculation_9]'}
+        rewritten = cp.parse_formula(formula).rewrite(forward)
+        self.assertEqual(rewritten, '{FIXED [Calculation_7] : SUM([Calculation_8])} /* [Sales [EUR]]] */ - [Calculation_9]')
+        backward = {new: old for old, new in forward.items()}
+        self.assertEqual(cp.parse_formula(rewritten).rewrite(backward),
+                         '{FIXED [Region] : SUM([Sales [EUR]]])} /* [Sales [EUR]]] */ - [Umsätze]')
+
+
+class MemoTest(unittest.TestCase):
+
+    def test_clear_cache(self):
+        cp.parse_formula('[Sales] + 1')
+        self.assertGreater(cp.parse_formula.cache_info().currsize, 0)
+        cp.clear_cache()
+        self.assertEqual(cp.parse_formula.cache_info().currsize, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
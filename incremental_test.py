@@ -0,0 +1,160 @@
+"""
+incremental_test.py
+
+Equivalence test for incremental runs (process_workbook(incremental=True)): after each kind of
+edit, the outputs an incremental run patches in place (IncrementalState.patch_excel/patch_html,
+Excelcreator.patch_excel_rows, patch_lineage_html) must be byte-identical to those of a full run.
+
+    python -m unittest discover -p "*test.py"
+"""
+
+import os
+import zipfile
+import tempfile
+import unittest
+from unittest import mock
+
+import Excelcreator as exg
+import Extractioncache as xc
+import Extractorengine as eng
+
+
+WORKBOOK_TWB = """<?xml version='1.0' encoding='utf-8' ?>
+<workbook version='18.1'>
+<datasources>
+<datasource hasconnection='false' inline='true' name='Parameters' version='18.1'>
+<column caption='Rate' datatype='real' name='[Parameter 1]' param-domain-type='any' role='measure' type='quantitative' value='0.1'><calculation class='tableau' formula='0.1' /></column>
+</datasource>
+<datasource caption='Orders' inline='true' name='federated.orders' version='18.1'>
+<connection class='federated'><named-connections /></connection>
+<column datatype='real' name='[Sales]' role='measure' type='quantitative' />
+<column datatype='real' name='[Cost]' role='measure' type='quantitative' />
+<column datatype='string' name='[Region]' role='dimension' type='nominal' />
+<column caption='Gap' datatype='real' name='[Calculation_1]' role='measure' type='quantitative'><calculation class='tableau' formula='[Sales] - [Cost]' /></column>
+<column caption='Gap Pct' datatype='real' name='[Calculation_2]' role='measure' type='quantitative'><calculation class='tableau' formula='[Calculation_1] / [Sales] // share of [Sales]' /></column>
+<column caption='Taxed' datatype='real' name='[Calculation_3]' role='measure' type='quantitative'><calculation class='tableau' formula='[Calculation_2] * [Parameters].[Parameter 1]' /></column>
+<column caption='Label' datatype='string' name='[Calculation_4]' role='dimension' type='nominal'><calculation class='tableau' formula='IF [Calculation_1] &gt; 0 THEN &quot;[up]&quot; ELSE &quot;down&quot; END' /></column>
+<column caption='Unused' datatype='real' name='[Calculation_5]' role='measure' type='quantitative'><calculation class='tableau' formula='[Cost] * 2' /></column>
+</datasource>
+</datasources>
+<worksheets>
+<worksheet name='Overview'><table><view><datasource-dependencies datasource='federated.orders'><column name='[Region]' /><column name='[Calculation_3]' /></datasource-dependencies><datasource-dependencies datasource='Parameters'><column name='[Parameter 1]' /></datasource-dependencies></view></table></worksheet>
+<worksheet name='Detail'><table><view><datasource-dependencies datasource='federated.orders'><column name='[Calculation_4]' /></datasource-dependencies></view></table></worksheet>
+</worksheets>
+</workbook>
+"""
+
+# (name, text to replace, replacement, outputs the incremental run patches in place)
+EDITS = [
+    ('caption rename', "caption='Gap' ", "caption='Gap &amp; &lt;Margin&gt;' ", ['excel', 'html']),
+    ('formula retarget', 'IF [Calculation_1] &gt; 0', 'IF [Calculation_2] &gt; 0', ['excel']),
+    ('worksheet usage', "<column name='[Calculation_4]' />", "<column name='[Calculation_4]' /><column name='[Calculation_1]' />",
+     ['excel', 'html']),
+    ('datatype change', "datatype='string' name='[Calculation_4]'", "datatype='integer' name='[Calculation_4]'", ['excel']),
+    # A caption starting with '=' would be a formula cell, which patch_excel_rows leaves to a full write
+    ('excel fallback', "caption='Gap' ", "caption='=Gap' ", ['html']),
+]
+
+
+def package_members(excel_path):
+    # Every member of an .xlsx package except docProps/core.xml, which holds the creation time
+    with zipfile.ZipFile(excel_path) as package:
+        return {name: package.read(name) for name in package.namelist() if name != 'docProps/core.xml'}
+
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class IncrementalOutputsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.workbook_path = os.path.join(self.tmp.name, 'Orders.twb')
+        self.write_workbook(WORKBOOK_TWB)
+        self.cache = xc.ExtractionCache(os.path.join(self.tmp.name, 'cache'))
+        self.incremental_dir = os.path.join(self.tmp.name, 'incremental')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_workbook(self, text):
+        with open(self.workbook_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def run_incremental(self):
+        return eng.process_workbook(self.workbook_path, self.incremental_dir, cache=self.cache, incremental=True)
+
+    def assert_same_outputs(self, summary, name):
+        full = eng.process_workbook(self.workbook_path, os.path.join(self.tmp.name, 'full', name.replace(' ', '_')))
+        self.assertEqual(package_members(summary['excel_path']), package_members(full['excel_path']))
+        self.assertEqual(read_bytes(summary['html_path']), read_bytes(full['html_path']))
+
+    def test_edits(self):
+        for name, old, new, patched in EDITS:
+            with self.subTest(edit=name):
+                self.assertIn(old, WORKBOOK_TWB)
+                self.write_workbook(WORKBOOK_TWB)
+                self.run_incremental()
+                self.write_workbook(WORKBOOK_TWB.replace(old, new, 1))
+                summary = self.run_incremental()
+                self.assertEqual(summary['patched_outputs'], patched)
+                self.assert_same_outputs(summary, name)
+
+    def test_unchanged_workbook_reuses_outputs(self):
+        self.run_incremental()
+        summary = self.run_incremental()
+        self.assertTrue(summary['cached'])
+        self.assertEqual(summary['reused_outputs'], ['excel', 'html'])
+        self.assert_same_outputs(summary, 'unchanged')
+
+    def test_html_patched_in_small_chunks(self):
+        # Node JSON that straddles two reads must still be found
+        self.run_incremental()
+        self.write_workbook(WORKBOOK_TWB.replace(*EDITS[0][1:3]))
+        with mock.patch.object(eng, '_HTML_PATCH_CHUNK_SIZE', 7):
+            summary = self.run_incremental()
+        self.assertIn('html', summary['patched_outputs'])
+        self.assert_same_outputs(summary, 'small chunks')
+
+
+class PatchFallbackTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.excel_path = os.path.join(self.tmp.name, 'table.xlsx')
+        self.records = [('Sales', 'real', 'Default_Field'), ('Gap', 'real', 'Calculated_Field')]
+        exg.write_excel_records(self.records, ['Field_Name', 'DataType', 'Type'], self.excel_path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_patch_excel_rows(self):
+        self.assertTrue(exg.patch_excel_rows(self.excel_path, [(2, self.records[1], ('Margin', 'real', 'Calculated_Field'))]))
+        expected_path = os.path.join(self.tmp.name, 'expected.xlsx')
+        exg.write_excel_records([self.records[0], ('Margin', 'real', 'Calculated_Field')], ['Field_Name', 'DataType', 'Type'],
+                                expected_path)
+        self.assertEqual(package_members(self.excel_path), package_members(expected_path))
+
+    def test_patch_excel_rows_falls_back(self):
+        before = read_bytes(self.excel_path)
+        # The previous record does not match the file
+        self.assertFalse(exg.patch_excel_rows(self.excel_path, [(2, ('Other', 'real', 'Calculated_Field'), self.records[1])]))
+        # A formula is not a plain string cell
+        self.assertFalse(exg.patch_excel_rows(self.excel_path, [(2, self.records[1], ('=Gap', 'real', 'Calculated_Field'))]))
+        self.assertEqual(read_bytes(self.excel_path), before)
+
+    def test_patch_lineage_html_falls_back(self):
+        html_path = os.path.join(self.tmp.name, 'diagram.html')
+        nodes = [eng.default_field_node('AA', 'Sales', 'Orders', '[Sales]', [])]
+        eng.render_html(nodes, [], 'diagram', html_path)
+        before = read_bytes(html_path)
+        missing = dict(nodes[0], label='Other')
+        self.assertFalse(eng.patch_lineage_html(html_path, [(missing, nodes[0])]))
+        self.assertEqual(read_bytes(html_path), before)
+        self.assertFalse(os.path.exists(html_path + '.tmp'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+lineage_ids_test.py
+
+Regression test for the diagram node IDs on a synthetic 50,000-field workbook
+(benchmarks/synthetic_workbook.py): IDs stay unique past the 676 two-letter ones, and the node
+and edge counts match the lineage worked out independently from the generated model.
+
+    python -m unittest discover -p "*test.py"
+"""
+
+import os
+import re
+import sys
+import itertools
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+import Extractorengine as eng
+import synthetic_workbook as swb
+
+
+N_FIELDS = 50000
+
+
+def expected_lineage(model):
+    """(nodes, edges) counts of the lineage of a synthetic model, without going through the extractor.
+
+    Nodes are the fields used on a worksheet plus every field those use through calculations;
+    each distinct reference of a calculation in the lineage is one edge.
+    """
+
+    references = {}
+    for calc in [c for ds in model['datasources'] for c in ds['calcs']] + model['parameters']:
+        # Generated formulas only hold brackets in the "[ok]"/"[check]" literals and the [Parameters] qualifier
+        code = re.sub(r'"[^"]*"', '', calc['formula'])
+        references[calc['id']] = set(re.findall(r'\[[^\]]+\]', code)) - {'[Parameters]'}
+
+    bound = {field_id for worksheet in model['worksheets'] for _, field_id in worksheet['fields']}
+    members = set(bound)
+    pending = [ref for field_id in bound for ref in references.get(field_id, ())]
+    while pending:
+        field_id = pending.pop()
+        if field_id not in members:
+            members.add(field_id)
+            pending.extend(references.get(field_id, ()))
+    return len(members), sum(len(references[field_id]) for field_id in members if field_id in references)
+
+
+class AbbreviationIdsTest(unittest.TestCase):
+
+    def test_length_grows_after_two_letters(self):
+        ids = list(itertools.islice(eng.abbreviation_ids(), 677))
+        self.assertEqual(ids[0], 'AA')
+        self.assertEqual(ids[675], 'ZZ')
+        self.assertEqual(ids[676], 'AAA')
+
+    def test_prefix(self):
+        ids = list(itertools.islice(eng.abbreviation_ids('x___'), 677))
+        self.assertEqual(ids[675], 'x___ZZ')
+        self.assertEqual(ids[676], 'x___AAA')
+
+
+class SyntheticWorkbookLineageTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with tempfile.TemporaryDirectory() as tmp:
+            workbook_path = os.path.join(tmp, 'synthetic.twb')
+            cls.spec = swb.generate_workbook(workbook_path, fields=N_FIELDS)
+            df1, df_API_all = eng.extract_calculations(eng.load_workbook(workbook_path))
+        cls.nodes, cls.edges, _, _ = eng.resolve_lineage(df1, df_API_all)
+
+    def test_node_ids_unique(self):
+        node_ids = [node['id'] for node in self.nodes]
+        self.assertEqual(len(node_ids), len(set(node_ids)))
+        # Both default fields and calculations need more than the 676 two-letter IDs here
+        self.assertIn('AAA', node_ids)
+        self.assertIn('x___AAA', node_ids)
+
+    def test_edges_connect_nodes(self):
+        node_ids = {node['id'] for node in self.nodes}
+        for edge in self.edges:
+            self.assertIn(edge['from'], node_ids)
+            self.assertIn(edge['to'], node_ids)
+
+    def test_counts_match_generated_graph(self):
+        expected_nodes, expected_edges = expected_lineage(swb.build_model(self.spec))
+        self.assertEqual(len(self.nodes), expected_nodes)
+        self.assertEqual(len(self.edges), expected_edges)
+
+
+if __name__ == "__main__":
+    unittest.main()
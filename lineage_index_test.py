@@ -0,0 +1,83 @@
+"""
+lineage_index_test.py
+
+Regression test for the cross-workbook lineage index (Lineageindex.py) on a workbook whose two
+datasources both define [Sales]: each datasource keeps its own field rows and references.
+
+    python -m unittest discover -p "*test.py"
+"""
+
+import os
+import tempfile
+import unittest
+
+import Extractioncache as xc
+import Lineageindex as li
+
+
+TWO_DATASOURCES_TWB = """<?xml version='1.0' encoding='utf-8' ?>
+<workbook version='18.1'>
+<datasources>
+<datasource hasconnection='false' inline='true' name='Parameters' version='18.1'>
+<column caption='Rate' datatype='real' name='[Parameter 1]' role='measure' type='quantitative'><calculation class='tableau' formula='0.1' /></column>
+</datasource>
+<datasource caption='Orders A' inline='true' name='federated.a' version='18.1'>
+<connection class='federated'><named-connections /></connection>
+<column datatype='real' name='[Sales]' role='measure' type='quantitative' />
+<column caption='Double' datatype='real' name='[Calculation_1]' role='measure' type='quantitative'><calculation class='tableau' formula='[Sales] * 2' /></column>
+</datasource>
+<datasource caption='Orders B' inline='true' name='federated.b' version='18.1'>
+<connection class='federated'><named-connections /></connection>
+<column datatype='real' name='[Sales]' role='measure' type='quantitative' />
+<column caption='Triple' datatype='real' name='[Calculation_2]' role='measure' type='quantitative'><calculation class='tableau' formula='[Sales] * 3 * [Parameters].[Parameter 1]' /></column>
+</datasource>
+</datasources>
+<worksheets>
+<worksheet name='Sheet A'><table><view><datasource-dependencies datasource='federated.a'><column name='[Sales]' /><column name='[Calculation_1]' /></datasource-dependencies></view></table></worksheet>
+<worksheet name='Sheet B'><table><view><datasource-dependencies datasource='federated.b'><column name='[Calculation_2]' /></datasource-dependencies></view></table></worksheet>
+</worksheets>
+</workbook>
+"""
+
+
+class TwoDatasourceIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.workbook_path = os.path.join(self.tmp.name, 'two.twb')
+        with open(self.workbook_path, 'w', encoding='utf-8') as f:
+            f.write(TWO_DATASOURCES_TWB)
+        self.db_path = os.path.join(self.tmp.name, 'index.db')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def check_index(self):
+        by_caption = {ds: li.find_field_usage(self.db_path, 'Sales', ds) for ds in ('Orders A', 'Orders B')}
+        self.assertEqual([r['datasource'] for r in by_caption['Orders A']], ['federated.a'])
+        self.assertEqual([r['datasource'] for r in by_caption['Orders B']], ['federated.b'])
+        # References stay within the datasource of the calculation
+        self.assertEqual([r['name'] for r in by_caption['Orders A'][0]['referenced_by']], ['Double'])
+        self.assertEqual([r['name'] for r in by_caption['Orders B'][0]['referenced_by']], ['Triple'])
+        self.assertEqual(by_caption['Orders A'][0]['worksheets'], ['Sheet A'])
+        self.assertFalse(by_caption['Orders B'][0]['used_in_report'])
+
+        parameter, = li.find_field_usage(self.db_path, 'Rate')
+        self.assertEqual(parameter['datasource'], 'Parameters')
+        self.assertEqual([r['name'] for r in parameter['referenced_by']], ['Triple'])
+
+    def test_field_in_both_datasources(self):
+        summary = li.index_workbooks(self.db_path, [self.workbook_path], workers=1)
+        self.assertEqual(summary['indexed'], 1)
+        self.check_index()
+
+    def test_field_in_both_datasources_from_cache(self):
+        cache = xc.ExtractionCache(os.path.join(self.tmp.name, 'cache'))
+        li.index_workbooks(self.db_path, [self.workbook_path], workers=1, cache=cache)
+        os.remove(self.db_path)
+        li.index_workbooks(self.db_path, [self.workbook_path], workers=1, cache=cache)
+        self.check_index()
+
+
+if __name__ == "__main__":
+    unittest.main()
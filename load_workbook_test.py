@@ -0,0 +1,77 @@
+"""
+load_workbook_test.py
+
+Tests for opening workbooks with the Document API (Extractorengine.load_workbook): workbooks
+older than the Document API supports are rejected up front, from a .twb or a .twbx.
+
+    python -m unittest discover -p "*test.py"
+"""
+
+import os
+import zipfile
+import tempfile
+import unittest
+
+from tableaudocumentapi.xfile import TableauInvalidFileException, TableauVersionNotSupportedException
+
+import Extractorengine as eng
+
+
+WORKBOOK_TWB = """<?xml version='1.0' encoding='utf-8' ?>
+<workbook version='{version}'>
+<datasources>
+<datasource caption='Orders' inline='true' name='federated.orders' version='{version}'>
+<column datatype='real' name='[Sales]' role='measure' type='quantitative' />
+</datasource>
+</datasources>
+<worksheets />
+</workbook>
+"""
+
+
+class LoadWorkbookVersionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_twb(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def write_twbx(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        with zipfile.ZipFile(path, 'w') as package:
+            package.writestr('Workbook.twb', text)
+        return path
+
+    def test_supported_version_loads(self):
+        workbook = eng.load_workbook(self.write_twb('new.twb', WORKBOOK_TWB.format(version='18.1')))
+        self.assertEqual([ds.caption for ds in workbook.datasources], ['Orders'])
+
+    def test_old_version_rejected(self):
+        for path in (self.write_twb('old.twb', WORKBOOK_TWB.format(version='8.3')),
+                     self.write_twbx('old.twbx', WORKBOOK_TWB.format(version='8.3')),
+                     self.write_twb('unversioned.twb', WORKBOOK_TWB.replace(" version='{version}'", ''))):
+            with self.subTest(path=os.path.basename(path)):
+                with self.assertRaises(TableauVersionNotSupportedException):
+                    eng.load_workbook(path)
+
+    def test_old_version_fails_cleanly_in_batch(self):
+        path = self.write_twb('old.twb', WORKBOOK_TWB.format(version='8.3'))
+        result = eng._batch_worker(path, self.tmp.name, os.path.join(self.tmp.name, 'out'))
+        self.assertEqual(result['status'], 'error')
+        self.assertTrue(result['error'].startswith('TableauVersionNotSupportedException'))
+
+    def test_datasource_root_rejected(self):
+        path = self.write_twb('datasource.twb', WORKBOOK_TWB.replace('workbook', 'datasource').format(version='18.1'))
+        with self.assertRaises(TableauInvalidFileException):
+            eng.load_workbook(path)
+
+
+if __name__ == "__main__":
+    unittest.main()